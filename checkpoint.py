@@ -0,0 +1,162 @@
+"""Checkpoint and resume support for the SMT-based learners.
+
+A checkpoint stores the state of a Learner (R, S, extra_S, E, pending
+triples and formulas), the membership queries answered by the teacher
+so far, and the variables of the learning loop (state_num, step, ...).
+
+z3 objects cannot be pickled. They are replaced by references into a
+pool of expressions, which is stored as a single SMT-LIB string and
+parsed again when the checkpoint is loaded. The teacher is not stored
+either: the one passed to load_checkpoint is attached to the learner.
+
+"""
+
+import os
+import pickle
+import io
+
+import z3
+
+# Attributes of the teacher caching the answers of membership queries
+# (query for OTA, query1 and query2 for OCMM, query_reset for both).
+QUERY_CACHES = ("query", "query1", "query2", "query_reset")
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file, teacher):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.teacher = teacher
+        self.exprs = []
+        self.expr_index = dict()
+
+    def expr_ref(self, e):
+        if e.get_id() not in self.expr_index:
+            self.expr_index[e.get_id()] = len(self.exprs)
+            self.exprs.append(e)
+        return self.expr_index[e.get_id()]
+
+    def persistent_id(self, obj):
+        if obj is self.teacher:
+            return ("teacher",)
+        elif isinstance(obj, z3.ExprRef):
+            return ("expr", self.expr_ref(obj))
+        elif isinstance(obj, z3.Solver):
+            # The same formula may have been asserted several times.
+            refs = dict.fromkeys(self.expr_ref(f) for f in obj.assertions())
+            return ("solver", tuple(refs))
+        else:
+            return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, teacher, exprs):
+        super().__init__(file)
+        self.teacher = teacher
+        self.exprs = exprs
+
+    def persistent_load(self, pid):
+        if pid[0] == "teacher":
+            return self.teacher
+        elif pid[0] == "expr":
+            return self.exprs[pid[1]]
+        elif pid[0] == "solver":
+            solver = z3.Solver()
+            solver.add(*(self.exprs[i] for i in pid[1]))
+            return solver
+        else:
+            raise pickle.UnpicklingError("Unknown persistent id %s" % str(pid))
+
+
+def exprs_to_smt2(exprs):
+    """Convert a list of z3 expressions into an SMT-LIB string. Formulas
+    are written as assertions. Any other term e is written as the
+    assertion (= e e).
+
+    Return a tuple (text, kinds), where kinds contains one character
+    per expression: "f" for formulas and "t" for other terms.
+
+    """
+    # Work in a separate context, so that writing a checkpoint does not
+    # create terms in the context of the learner (which can change the
+    # models returned by the solver).
+    ctx = z3.Context()
+    solver = z3.Solver(ctx=ctx)
+    kinds = []
+    for e in exprs:
+        e = e.translate(ctx)
+        if z3.is_bool(e):
+            solver.add(e)
+            kinds.append("f")
+        else:
+            solver.add(e == e)
+            kinds.append("t")
+    return solver.sexpr(), "".join(kinds)
+
+def smt2_to_exprs(text, kinds):
+    """Inverse of exprs_to_smt2."""
+    if not kinds:
+        return []
+    formulas = z3.parse_smt2_string(text)
+    assert len(formulas) == len(kinds), "smt2_to_exprs: wrong number of formulas."
+    return [f.arg(0) if kind == "t" else f for f, kind in zip(formulas, kinds)]
+
+def save_checkpoint(path, teacher, learner, **loop_state):
+    """Write a checkpoint of learner and loop_state to path.
+
+    The file is replaced atomically, so an interrupted write leaves the
+    previous checkpoint intact.
+
+    """
+    buf = io.BytesIO()
+    pickler = _Pickler(buf, teacher)
+    pickler.dump((learner, loop_state))
+
+    queries = dict()
+    for name in QUERY_CACHES:
+        if hasattr(teacher, name):
+            queries[name] = getattr(teacher, name)
+
+    text, kinds = exprs_to_smt2(pickler.exprs)
+    data = {
+        "smt2": text,
+        "kinds": kinds,
+        "state": buf.getvalue(),
+        "queries": queries,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def restore_options(loop_state, options):
+    """Return the options of the learning loop, with the values saved in
+    loop_state in place of the given ones. Options missing in loop_state
+    keep their given value. A message is printed for each given value
+    that is replaced.
+
+    """
+    res = dict(options)
+    for name, value in loop_state.get("options", dict()).items():
+        if name in res and res[name] != value:
+            print("Option %s=%r restored from the checkpoint (given %r)." % (name, value, res[name]))
+        res[name] = value
+    return res
+
+def load_checkpoint(path, teacher):
+    """Load a checkpoint written by save_checkpoint.
+
+    teacher - the system under learning, whose query caches are restored
+        from the checkpoint.
+
+    Return a tuple (learner, loop_state).
+
+    """
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+
+    for name, answers in data["queries"].items():
+        getattr(teacher, name).update(answers)
+
+    exprs = smt2_to_exprs(data["smt2"], data["kinds"])
+    unpickler = _Unpickler(io.BytesIO(data["state"]), teacher, exprs)
+    return unpickler.load()
@@ -188,7 +188,22 @@ class Learner:
         # Store the (tw1, tw2, reset, f) triple in which records resets for tw1[:-1] == tw2[:-1]
         self.constraint4_triple3 = []
 
+        # Incremental solver. Constraints 1, 5, 6 and 7 only grow, and are
+        # added to it as rows arrive. The number of states n and the
+        # formulas that may be removed are enabled by assumption literals.
+        self.solver = z3.Solver()
+        self.state_num_name = z3.Int("n")
+        self.state_num_literal = dict()
+        self.guard = dict()
+
+        # Number of formulas of constraint1, rows of R and rows of S already
+        # added to the solver.
+        self.constraint1_added = 0
+        self.bounded_num = 0
+        self.pinned_num = 0
+
         self.addPath(())
+        self.solver.add(self.state_name[()] == 1)
 
         # Count the number of occurrence
         self.formulas_count = dict()
@@ -493,125 +508,125 @@ class Learner:
         assert len(formula) > 0, "Invalid resets!"
         return z3.And(formula)
 
-    def differentStateUnderReset(self, states_var, resets_var):
+    def differentStateUnderReset(self):
         """Constraint 1: find different states under some reset settings.
-        
-        states_var - mapping from rows to states variables
-        resets_var - mapping from rows to resets variables
+        Formulas of constraint 1 are never removed, so only the formulas
+        added since the last call are returned.
 
-        Return a formula encoding the relation.
         """
-        if len(self.constraint1_formula) > 0:
-            return z3.And(self.constraint1_formula)
-        else:
-            return True
+        formulas = self.constraint1_formula[self.constraint1_added:]
+        self.constraint1_added = len(self.constraint1_formula)
+        return formulas
 
-    def noForbiddenPair(self, non_sink_row, states_var, resets_var):
+    def noForbiddenPair(self):
         """Constraint 2: for any tow rows R1 + (a, t1) and R2 + (a, t2), 
         if states[R1] = states[R2], and they are in the same time interval,
         if the two rows are at same states, then they should have same reset settings.        
         """
-        if self.constraint2_formula:
-            return z3.And(self.constraint2_formula)
-        else:
-            return True
+        return self.constraint2_formula
 
-    def checkConsistency(self, states_var, resets_var):
+    def checkConsistency(self):
         """Constraint 4: for any two rows R1 + (a, t1), R2 + (a, t2). If R1 and R2 are
         in the same states, and under the current reset settings these two rows are in
         the same time interval, then their states should also be same."""
-        formulas = self.constraint4_formula1 + self.constraint4_formula2
-        
         if len(self.constraint4_formula1) > 0:
-            return z3.And(formulas)
-        # if len(self.constraint4_formula1) > 0:
-        #     return z3.And(self.constraint4_formula1)
+            return self.constraint4_formula1 + self.constraint4_formula2
         else:
-            return True
+            return []
 
-    def setSinkRowReset(self, resets_var):
+    def setSinkRowReset(self, new_rows):
         """Constraint 5: All sink rows's resets are set to True."""
+        return [self.reset_name[r] == True for r in new_rows if self.R[r].is_sink]
+
+    def encodeStateNum(self, new_rows):
+        """Constraint 6: the state of each row is between 1 and n, except
+        sink rows, whose state is n + 1.
+
+        """
         formulas = []
-        for r, info in self.R.items():
-            if info.is_sink:
-                formulas.append(resets_var[r]==True)
+        for r in new_rows:
+            if self.R[r].is_sink:
+                formulas.append(self.state_name[r] == self.state_num_name + 1)
+            else:
+                formulas.append(z3.And(self.state_name[r] >= 1, self.state_name[r] <= self.state_num_name))
+        return formulas
 
-        if formulas:
-            return z3.And(formulas)
-        else:
-            return True
+    def encodeSRow(self):
+        """Each row in S should have a unique state. Only the formulas for
+        rows added to S since the last call are returned.
 
-    def encodeSRow(self, states_var):
-        """Each row in S should have a unique state."""
+        """
         formulas = []
-        i = 1
-        for s in self.S:
-            formulas.append(states_var[s] == i)
-            i += 1
-        
-        return z3.And(formulas)
+        for i, s in enumerate(self.S):
+            if i >= self.pinned_num:
+                formulas.append(self.state_name[s] == i + 1)
+        self.pinned_num = len(self.S)
+
+        return formulas
+
+    def stateNumLiteral(self, state_num):
+        """Return the assumption literal setting n to state_num."""
+        if state_num not in self.state_num_literal:
+            lit = z3.Bool("n_%d" % state_num)
+            self.solver.add(z3.Implies(lit, self.state_num_name == state_num))
+            self.state_num_literal[state_num] = lit
+        return self.state_num_literal[state_num]
+
+    def guardLiteral(self, f):
+        """Return the assumption literal enabling formula f, which may be
+        removed later (constraint 2, constraint 4 and banned_reset).
+
+        """
+        if f.get_id() not in self.guard:
+            lit = z3.Bool("g_%d" % len(self.guard))
+            self.solver.add(z3.Implies(lit, f))
+            # Keep f alive, so that its id is not reused.
+            self.guard[f.get_id()] = (f, lit)
+        return self.guard[f.get_id()][1]
 
     def findReset(self):
         """Find a valid setting of resets and states.
         
         Return a tuple (resets, states). 
 
-        state_num - the possible number of states
+        The number of states is tried from len(S) up to the number of
+        non-sink rows, each time with the same solver: new formulas of
+        constraints 1, 5, 6 and 7 are added to it once, while the formulas
+        that may be removed and the number of states are enabled by
+        assumption literals.
+
         """
         # find non_sink rows
         non_sink_R = dict((twR, infoR) for twR, infoR in self.R.items()
                           if not infoR.is_sink)
 
-        states_var, resets_var = self.state_name, self.reset_name
-
-        var_states = dict((v, k) for k, v in states_var.items())
-        var_resets = dict((v, k) for k, v in resets_var.items())
+        new_rows = list(self.R)[self.bounded_num:]
+        self.bounded_num = len(self.R)
+        self.solver.add(*self.differentStateUnderReset(), *self.setSinkRowReset(new_rows),
+                        *self.encodeStateNum(new_rows), *self.encodeSRow())
 
-        constraint1 = self.differentStateUnderReset(states_var, resets_var)
-        constraint2 = self.noForbiddenPair(non_sink_R, states_var, resets_var)
-        constraint4 = self.checkConsistency(states_var, resets_var)
-        constraint5 = self.setSinkRowReset(resets_var)
-        constraint7 = self.encodeSRow(states_var)
+        guards = [self.guardLiteral(f) for f in
+                  self.noForbiddenPair() + self.checkConsistency() + self.banned_reset]
 
         result = "unsat"
         minimum_states_num = len(self.S)
         # time1 = time.perf_counter()
         for i in range(minimum_states_num, len(non_sink_R)+1):
-            constraint6 = []
-            for s, row in var_states.items():
-                if self.R[row].is_sink:
-                    constraint6.append(s == i + 1)
-                else:
-                    constraint6.append(z3.And(s>=1, s<=i))
-            constraint6 = z3.And(constraint6)
-            s = z3.Solver()
-            s.add(*self.banned_reset, constraint1, constraint2, constraint4, constraint5, constraint6, constraint7, states_var[tuple()]==1)
-            if str(s.check()) == "sat":
+            if self.solver.check(*guards, self.stateNumLiteral(i)) == z3.sat:
                 result = "sat"
                 break
-            else:
-                continue
 
         # print("z3", time.perf_counter() - time1)
         if result == "unsat":
             return None, None
 
-        model = s.model()
-        # print("model", model)
+        model = self.solver.model()
         resets, states = dict(), dict()
-
-        for v in model:
-            if isinstance(model[v], z3.ArithRef):
-                states[var_states[z3.Int(str(v))]] = str(model[v])
-            elif isinstance(model[v], z3.BoolRef):
-                resets[var_resets[z3.Bool(str(v))]] = bool(model[v])
-            else:
-                raise NotImplementedError
-
-        # set all reset variables to True which do not exist in constraints
-        for v, row in var_resets.items():
-            if row not in resets:
-                resets[row] = True
+        for row in self.R:
+            states[row] = str(model.eval(self.state_name[row], model_completion=True))
+            # set all reset variables to True which do not exist in constraints
+            r = model[self.reset_name[row]]
+            resets[row] = True if r is None else z3.is_true(r)
 
         states["sink"] = str(i + 1)
 
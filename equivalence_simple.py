@@ -3,11 +3,10 @@ timed automata.
 
 """
 
-import queue
+from collections import deque
 from decimal import Decimal
 
 import ota
-import interval
 
 def round_div_2(r):
     """r is of the form 0.xxxn. If n is even, return 0.xxx(n/2).
@@ -32,78 +31,149 @@ dec_one = Decimal(1)
 
 LESS, EQ, GREATER = range(3)
 
-class Configuration:
-    """A configuration consists of states for the left and right timed
-    automata. Each state consists of location and region. If both sides
-    are in fraction regions, then an additional boolean variable indicates
-    whether the left automata has smaller fraction value.
-    
+class TransitionTable:
+    """Transitions of a deterministic one-clock automaton (OTA or OCMM),
+    compiled into a dense table indexed by location id, region and action
+    id. Regions are numbered as in OTAEquivalence, up to the last region
+    (max_value, oo) of the largest constant max_value of the automaton.
+    Larger regions are contained in the same constraints as the last
+    region, so the table can be used by equivalence tests with any
+    max_value.
+
+    Each entry is a tuple (target, reset, output), where target is a
+    location id. For an OTA, the output is whether the target is
+    accepting. For an OCMM, it is the output of the transition.
+
+    """
+    def __init__(self, automaton):
+        self.locs = [loc.name for loc in automaton.locations]
+        self.loc_id = dict((name, i) for i, name in enumerate(self.locs))
+        self.num_actions = len(automaton.sigma)
+        self.action_id = dict((action, a) for a, action in enumerate(automaton.sigma))
+        self.init = self.loc_id[automaton.init_state]
+
+        self.max_value = 0
+        for tran in automaton.trans:
+            for bound in (tran.constraint.min_value, tran.constraint.max_value):
+                if bound != '+':
+                    self.max_value = max(self.max_value, bound)
+        self.last_region = 2 * self.max_value + 1
+
+        is_ocmm = not hasattr(automaton, 'accept_states')
+        self.trans = [None] * (len(self.locs) * (self.last_region + 1) * self.num_actions)
+        for a, action in enumerate(automaton.sigma):
+            for loc in self.locs:
+                for tran in automaton.trans_dict[(action, loc)]:
+                    if is_ocmm:
+                        output = tran.output
+                    else:
+                        output = tran.target in automaton.accept_states
+                    entry = (self.loc_id[tran.target], tran.reset, output)
+                    for region in self.regions(tran.constraint):
+                        self.trans[self.index(self.loc_id[loc], region) + a] = entry
+
+    def regions(self, constraint):
+        """Return the range of regions contained in constraint."""
+        low = 2 * constraint.min_value + (0 if constraint.closed_min else 1)
+        if constraint.max_value == '+':
+            high = self.last_region
+        else:
+            high = 2 * constraint.max_value - (0 if constraint.closed_max else 1)
+        return range(low, high + 1)
+
+    def index(self, loc, region):
+        """Index in trans of the transition from loc in region under the
+        first action.
+
+        """
+        return (loc * (self.last_region + 1) + min(region, self.last_region)) * self.num_actions
+
+    def lookup(self, loc, region):
+        """Return the list of transitions from loc in region, one for each
+        action.
+
+        """
+        i = self.index(loc, region)
+        return self.trans[i:i+self.num_actions]
+
+    def run(self, tws):
+        """Run the timed word tws from the initial location. Return the
+        transition taken by the last timed word, or None if tws is empty or
+        has no run.
+
+        """
+        loc, clock, tran = self.init, 0, None
+        for tw in tws:
+            clock = clock + tw.time
+            n = int(clock)
+            tran = self.trans[self.index(loc, 2 * n if clock == n else 2 * n + 1) + self.action_id[tw.action]]
+            if tran is None:
+                return None
+            loc, reset, _ = tran
+            if reset:
+                clock = 0
+        return tran
+
+
+class OTAEquivalence:
+    """Equivalence test of two OTAs by breadth-first search on the product
+    of their region automata.
+
+    A configuration of the product consists of the location and region of
+    each side, and a flag (LESS, EQ or GREATER) comparing the fractional
+    parts of the two clocks. The flag is only significant when both sides
+    are in bounded fraction regions, and is EQ otherwise. A configuration
+    is packed into a single integer (see pack), with locations given by
+    their ids in the transition tables.
+
     Region is indicated by a single integer. The value 2 * n indicates
     the point region [n, n]. The value 2 * n + 1 indicates the region
     (n, n+1). The last region is 2 * max_value + 1, indicating the region
     (max_value, oo).
 
-    pre - previous configuration.
-    action - decimal number for delay, or string for name of an action.
+    The concrete delays of the counterexample are derived from the path
+    only when it is reconstructed (see find_path).
+
+    table_A, table_B - transition tables of ota_A and ota_B, built if not
+    given. The table of the teacher is built once per learning run.
+
+    succ_cache - if not None, a dictionary from configurations to their
+    successors, used and filled by the search (see cached_wsucc). It is
+    maintained across tests by IncrementalEquivalence.
 
     """
-    def __init__(self, loc_A, region_A, loc_B, region_B, frac_A, frac_B, *, pre=None, action=None):
-        self.loc_A = loc_A
-        self.region_A = region_A
-        self.loc_B = loc_B
-        self.region_B = region_B
-        self.frac_A = frac_A
-        self.frac_B = frac_B
-        
-        # For reconstructing the path
-        self.pre = pre
-        self.action = action
-
-    def __eq__(self, other):
-        return self.loc_A == other.loc_A and self.region_A == other.region_A and \
-               self.loc_B == other.loc_B and self.region_B == other.region_B and \
-               (self.frac_A == other.frac_A and self.frac_B == other.frac_B or \
-                self.frac_A < self.frac_B and other.frac_A < other.frac_B or \
-                self.frac_A > self.frac_B and other.frac_A > other.frac_B)
-
-    def __str__(self):
-        return "loc_A: %s region_A: %s loc_B: %s region_B: %s frac_A: %s frac_B: %s \n(pre: %s action: %s)" % (
-            self.loc_A, self.region_A, self.loc_B, self.region_B, self.frac_A, self.frac_B, self.pre, self.action)
-
-    def __hash__(self):
-        if self.frac_A < self.frac_B:
-            return hash(("CONFIG", self.loc_A, self.region_A, self.loc_B, self.region_B, LESS))
-        elif self.frac_A == self.frac_B:
-            return hash(("CONFIG", self.loc_A, self.region_A, self.loc_B, self.region_B, EQ))
-        elif self.frac_A > self.frac_B:
-            return hash(("CONFIG", self.loc_A, self.region_A, self.loc_B, self.region_B, GREATER))
-        else:
-            raise ValueError
+    # Delay successor graph on triples (region_A, region_B, flag) for each
+    # max_value, shared by all equivalence tests (see delay_succ).
+    delay_graphs = dict()
 
-class OTAEquivalence:
-    def __init__(self, max_value, ota_A, ota_B, is_ocmm=False):
+    def __init__(self, max_value, ota_A, ota_B, is_ocmm=False, *, table_A=None, table_B=None,
+                 succ_cache=None):
+        assert ota_A.sigma == ota_B.sigma, "OTAEquivalence: OTAs must have the same actions."
         self.max_value = max_value
         self.ota_A = ota_A
         self.ota_B = ota_B
-        assert ota_A.sigma == ota_B.sigma, "OTAEquivalence: OTAs must have the same actions."
-
-        self.init_config = Configuration(
-            self.ota_A.init_state, 0, self.ota_B.init_state, 0, dec_zero, dec_zero)
-
-        # Mapping from n to region
-        self.region_dict = dict()
-
-    def int_to_region(self, n):
-        if n in self.region_dict:
-            return self.region_dict[n]
-        elif n % 2 == 0:
-            self.region_dict[n] = interval.point_region(n // 2)
-        elif n == 2 * self.max_value + 1:
-            self.region_dict[n] = interval.inf_region(self.max_value)
-        else:
-            self.region_dict[n] = interval.frac_region(n // 2)
-
-        return self.region_dict[n]
+        self.sigma = ota_A.sigma
+        self.table_A = table_A if table_A is not None else TransitionTable(ota_A)
+        self.table_B = table_B if table_B is not None else TransitionTable(ota_B)
+        self.num_regions = 2 * max_value + 2
+        self.delay_graph = OTAEquivalence.delay_graphs.setdefault(max_value, dict())
+        self.succ_cache = succ_cache
+
+        self.init_config = self.pack(self.table_A.loc_id[ota_A.init_state], 0,
+                                     self.table_B.loc_id[ota_B.init_state], 0, EQ)
+
+    def pack(self, loc_A, region_A, loc_B, region_B, flag):
+        """Pack a configuration into a single integer."""
+        return (((loc_A * self.num_regions + region_A) * len(self.table_B.locs) + loc_B) \
+                * self.num_regions + region_B) * 3 + flag
+
+    def unpack(self, c):
+        """Inverse of pack, return the tuple (loc_A, region_A, loc_B, region_B, flag)."""
+        c, flag = divmod(c, 3)
+        c, region_B = divmod(c, self.num_regions)
+        c, loc_B = divmod(c, len(self.table_B.locs))
+        loc_A, region_A = divmod(c, self.num_regions)
+        return loc_A, region_A, loc_B, region_B, flag
 
     def is_inf(self, n):
         return n == 2 * self.max_value + 1
@@ -114,128 +184,271 @@ class OTAEquivalence:
     def is_frac(self, n):
         return n % 2 == 1
 
-    def delay_one(self, c):
-        """Delay the given configuration by the minimal time. Return the new
-        configuration, as well as a time increment.
-        
+    def delay_one(self, region_A, region_B, flag):
+        """Delay by the minimal time from the given regions and flag. Return
+        the new regions and flag.
+
         """
-        if self.is_inf(c.region_A):
-            if self.is_point(c.region_B):
-                return Configuration(c.loc_A, c.region_A, c.loc_B, c.region_B+1, dec_zero, dec_half), dec_half
+        if self.is_inf(region_A):
+            region_B += 1
+        elif self.is_inf(region_B):
+            region_A += 1
+        elif self.is_point(region_A) and self.is_point(region_B):
+            region_A, region_B, flag = region_A+1, region_B+1, EQ
+        elif self.is_point(region_A):
+            region_A, flag = region_A+1, LESS
+        elif self.is_point(region_B):
+            region_B, flag = region_B+1, GREATER
+        elif flag == EQ:
+            region_A, region_B = region_A+1, region_B+1
+        elif flag == LESS:
+            region_B += 1
+        else:  # flag == GREATER
+            region_A += 1
+
+        if not (self.is_frac(region_A) and self.is_frac(region_B)) or \
+           self.is_inf(region_A) or self.is_inf(region_B):
+            flag = EQ
+        return region_A, region_B, flag
+
+    def delay_succ(self, regions):
+        """Memoized version of delay_one on the triple regions = (region_A,
+        region_B, flag). Return None if both regions are infinite.
+
+        """
+        if regions not in self.delay_graph:
+            region_A, region_B, flag = regions
+            if self.is_inf(region_A) and self.is_inf(region_B):
+                self.delay_graph[regions] = None
+            else:
+                self.delay_graph[regions] = self.delay_one(region_A, region_B, flag)
+        return self.delay_graph[regions]
+
+    def delay_one_time(self, region_A, region_B, frac_A, frac_B):
+        """Concrete version of delay_one, where the fractional parts of the
+        clocks are given as decimal numbers. Return the new regions and
+        fractional parts, as well as a time increment.
+
+        """
+        if self.is_inf(region_A):
+            if self.is_point(region_B):
+                return region_A, region_B+1, dec_zero, dec_half, dec_half
             else:
-                return Configuration(c.loc_A, c.region_A, c.loc_B, c.region_B+1, dec_zero, dec_zero), 1 - c.frac_B
-        elif self.is_inf(c.region_B):
-            if self.is_point(c.region_A):
-                return Configuration(c.loc_A, c.region_A+1, c.loc_B, c.region_B, dec_half, dec_zero), dec_half
+                return region_A, region_B+1, dec_zero, dec_zero, 1 - frac_B
+        elif self.is_inf(region_B):
+            if self.is_point(region_A):
+                return region_A+1, region_B, dec_half, dec_zero, dec_half
             else:
-                return Configuration(c.loc_A, c.region_A+1, c.loc_B, c.region_B, dec_zero, dec_zero), 1 - c.frac_A
-        elif self.is_point(c.region_A) and self.is_point(c.region_B):
-            return Configuration(c.loc_A, c.region_A+1, c.loc_B, c.region_B+1, dec_half, dec_half), dec_half
-        elif self.is_point(c.region_A) and self.is_frac(c.region_B):
-            inc = round_div_2(dec_one - c.frac_B)
-            return Configuration(c.loc_A, c.region_A+1, c.loc_B, c.region_B, inc, c.frac_B + inc), inc
-        elif self.is_frac(c.region_A) and self.is_point(c.region_B):
-            inc = round_div_2(dec_one - c.frac_A)
-            return Configuration(c.loc_A, c.region_A, c.loc_B, c.region_B+1, c.frac_A + inc, inc), inc
-        elif self.is_frac(c.region_A) and self.is_frac(c.region_B):
-            if c.frac_A == c.frac_B:
-                return Configuration(c.loc_A, c.region_A+1, c.loc_B, c.region_B+1, dec_zero, dec_zero), 1 - c.frac_A
-            elif c.frac_A < c.frac_B:
-                inc = dec_one - c.frac_B
-                return Configuration(c.loc_A, c.region_A, c.loc_B, c.region_B+1, c.frac_A + inc, dec_zero), inc
-            else:  # c.frac_A > c.frac_B
-                inc = dec_one - c.frac_A
-                return Configuration(c.loc_A, c.region_A+1, c.loc_B, c.region_B, dec_zero, c.frac_B + inc), inc
+                return region_A+1, region_B, dec_zero, dec_zero, 1 - frac_A
+        elif self.is_point(region_A) and self.is_point(region_B):
+            return region_A+1, region_B+1, dec_half, dec_half, dec_half
+        elif self.is_point(region_A) and self.is_frac(region_B):
+            inc = round_div_2(dec_one - frac_B)
+            return region_A+1, region_B, inc, frac_B + inc, inc
+        elif self.is_frac(region_A) and self.is_point(region_B):
+            inc = round_div_2(dec_one - frac_A)
+            return region_A, region_B+1, frac_A + inc, inc, inc
+        elif self.is_frac(region_A) and self.is_frac(region_B):
+            if frac_A == frac_B:
+                return region_A+1, region_B+1, dec_zero, dec_zero, 1 - frac_A
+            elif frac_A < frac_B:
+                inc = dec_one - frac_B
+                return region_A, region_B+1, frac_A + inc, dec_zero, inc
+            else:  # frac_A > frac_B
+                inc = dec_one - frac_A
+                return region_A+1, region_B, dec_zero, frac_B + inc, inc
         else:
             raise AssertionError
 
-    def delay_seq(self, c):
-        """Obtain the sequence of delays from given configuration."""
-        results = [Configuration(c.loc_A, c.region_A, c.loc_B, c.region_B, c.frac_A, c.frac_B,
-                                 pre=c, action=dec_zero)]
-        inc_total = dec_zero
-        cur_config = c
-        while not (self.is_inf(cur_config.region_A) and self.is_inf(cur_config.region_B)):
-            cur_config, inc = self.delay_one(cur_config)
-            inc_total = inc_total + inc
-            cur_config.pre = c
-            cur_config.action = inc_total
-            results.append(cur_config)
-        return results
-
-    def is_bad(self, c):
-        """Determine whether c is a bad state. That is A side is accepting
-        but B side is not accepting, or vice versa.
-        
+    def compute_wsucc(self, c):
+        """Iterate over all successors of c. Each successor is given as a
+        tuple (nw, num_delay, action, is_bad), where nw is reached from c
+        by num_delay delay steps followed by action, and is_bad indicates
+        that the two sides give different outputs on the action. That is
+        A side is accepting but B side is not accepting, or vice versa.
+
         """
-        A_accept = c.loc_A in self.ota_A.accept_states
-        B_accept = c.loc_B in self.ota_B.accept_states
-        return A_accept != B_accept
-    
-    def immediate_asucc(self, c, action):
-        """Perform an immediate action, without further time delays."""
-        A_tran, B_tran = None, None
-        A_reg = self.int_to_region(c.region_A)
-        B_reg = self.int_to_region(c.region_B)
-
-        for tran in self.ota_A.trans_dict[(action, c.loc_A)]:
-            if tran.constraint.contains_interval(A_reg):
-                A_tran = tran
-        for tran in self.ota_B.trans_dict[(action, c.loc_B)]:
-            if tran.constraint.contains_interval(B_reg):
-                B_tran = tran
-        assert A_tran is not None and B_tran is not None
-
-        new_region_A = 0 if A_tran.reset else c.region_A
-        new_frac_A = dec_zero if A_tran.reset else c.frac_A
-        new_region_B = 0 if B_tran.reset else c.region_B
-        new_frac_B = dec_zero if B_tran.reset else c.frac_B
-        return Configuration(A_tran.target, new_region_A, B_tran.target, new_region_B, new_frac_A, new_frac_B,
-                             pre=c, action=action)
+        loc_A, region_A, loc_B, region_B, flag = self.unpack(c)
+        regions = (region_A, region_B, flag)
+        num_delay = 0
+        while regions is not None:
+            region_A, region_B, flag = regions
+            trans_A = self.table_A.lookup(loc_A, region_A)
+            trans_B = self.table_B.lookup(loc_B, region_B)
+            for action, tran_A, tran_B in zip(self.sigma, trans_A, trans_B):
+                target_A, reset_A, output_A = tran_A
+                target_B, reset_B, output_B = tran_B
+                nw = self.pack(target_A, 0 if reset_A else region_A,
+                               target_B, 0 if reset_B else region_B,
+                               EQ if reset_A or reset_B else flag)
+                yield nw, num_delay, action, output_A != output_B
+            regions = self.delay_succ(regions)
+            num_delay += 1
+
+    def cached_wsucc(self, c):
+        """Return the list of successors of c given by compute_wsucc, in the
+        same order, keeping only the first occurrence of each pair (nw,
+        is_bad). The list is stored in succ_cache.
 
-    def compute_wsucc(self, c):
-        """Compute the list of all successors of c."""
-        delay_seq = self.delay_seq(c)
-        results = []
-        for delay in delay_seq:
-            for action in self.ota_A.sigma:
-                imm_asucc = self.immediate_asucc(delay, action)
-                if imm_asucc not in results:
-                    results.append(imm_asucc)
-        return results
-
-    def find_path(self, c):
-        """Return the timed word reaching self."""
+        """
+        succs = self.succ_cache.get(c)
+        if succs is None:
+            first = dict()
+            for nw, num_delay, action, is_bad in self.compute_wsucc(c):
+                first.setdefault((nw, is_bad), (num_delay, action))
+            succs = [(nw, num_delay, action, is_bad)
+                     for (nw, is_bad), (num_delay, action) in first.items()]
+            self.succ_cache[c] = succs
+        return succs
+
+    def find_path(self, i):
+        """Return the timed word reaching the configuration with id i. The
+        delays are obtained by replaying the path from the initial
+        configuration with concrete fractional parts.
+
+        """
+        path = []
+        while i != 0:
+            path.append(i)
+            i = self.parent[i]
 
         tws = []
-        while c != self.init_config:
-            assert isinstance(c.action, str), 'find_path'
-            action = c.action
-            c = c.pre
-            assert isinstance(c.action, Decimal), 'find_path'
-            time = c.action
-            c = c.pre
-            tws.append(ota.TimedWord(action, time))
-        return tuple(reversed(tws))
+        region_A, region_B, frac_A, frac_B = 0, 0, dec_zero, dec_zero
+        for i in reversed(path):
+            time = dec_zero
+            for _ in range(self.num_delay[i]):
+                region_A, region_B, frac_A, frac_B, inc = \
+                    self.delay_one_time(region_A, region_B, frac_A, frac_B)
+                time = time + inc
+            _, region_A, _, region_B, _ = self.unpack(self.configs[i])
+            if region_A == 0:
+                frac_A = dec_zero
+            if region_B == 0:
+                frac_B = dec_zero
+            tws.append(ota.TimedWord(self.action[i], time))
+        return tuple(tws)
+
+    def add_config(self, c, parent, num_delay, action):
+        """Add configuration c, reached from parent by num_delay delay steps
+        and action, to the side arrays. Return its id.
+
+        """
+        self.configs.append(c)
+        self.parent.append(parent)
+        self.num_delay.append(num_delay)
+        self.action.append(action)
+        return len(self.configs) - 1
+
+    def find_counterexamples(self, limit=1):
+        """Return a list of at most limit counterexamples, in order of
+        increasing length. The bad configurations reached by the
+        counterexamples have pairwise different locations. The list is empty
+        if the two sides are equivalent.
+
+        """
+        # Each explored configuration is given an id, indexing the side
+        # arrays recording the path reaching it. Configurations are marked
+        # as explored when they are added to the frontier, so that each one
+        # is added only once. Bad configurations are not explored further.
+        self.configs, self.parent, self.num_delay, self.action = [], [], [], []
+        self.add_config(self.init_config, None, 0, None)
+        to_explore = deque([0])
+        explored = {self.init_config}
+        bad = dict()
+        wsucc = self.compute_wsucc if self.succ_cache is None else self.cached_wsucc
+
+        while to_explore:
+            i = to_explore.popleft()
+            for nw, num_delay, action, is_bad in wsucc(self.configs[i]):
+                if is_bad:
+                    loc_A, _, loc_B, _, _ = self.unpack(nw)
+                    if (loc_A, loc_B) not in bad:
+                        bad[(loc_A, loc_B)] = self.add_config(nw, i, num_delay, action)
+                        if len(bad) == limit:
+                            return [self.find_path(j) for j in bad.values()]
+                    continue
+
+                if nw not in explored:
+                    explored.add(nw)
+                    to_explore.append(self.add_config(nw, i, num_delay, action))
+
+        return [self.find_path(j) for j in bad.values()]
 
     def test_equivalent(self):
-        to_explore = queue.Queue()
-        explored = set()
-        to_explore.put(self.init_config)
+        ctxs = self.find_counterexamples(1)
+        if ctxs:
+            return False, ctxs[0]
+        return True, None
 
-        while True:
-            if to_explore.empty():
-                return True, None
 
-            c = to_explore.get()
-            if c in explored:
-                continue
-            explored.add(c)
+class IncrementalEquivalence:
+    """Equivalence tests of ota_A against successive candidates.
 
-            wsucc = self.compute_wsucc(c)
-            for nw in wsucc:
-                if self.is_bad(nw):
-                    return False, self.find_path(nw)
+    The successors of the configurations explored by each test are kept for
+    the next one (see OTAEquivalence.cached_wsucc). The successors of a
+    configuration depend on the transitions of the candidate from its
+    location, at its region and all later regions. They are dropped if any
+    of these transitions changed, and the configuration is explored again.
+    Locations of successive candidates are matched by name.
 
-                if nw not in explored:
-                    to_explore.put(nw)
+    equivalence - class of the equivalence test, OTAEquivalence or a
+    subclass.
+
+    """
+    def __init__(self, ota_A, table_A=None, equivalence=OTAEquivalence):
+        self.ota_A = ota_A
+        self.table_A = table_A if table_A is not None else TransitionTable(ota_A)
+        self.equivalence = equivalence
+        self.last = None
+
+    def changed_regions(self, table_B):
+        """Return a dictionary mapping each location name of the previous
+        candidate to the largest region at which its transitions differ in
+        table_B, or -1 if there is no such region. Locations missing in
+        table_B are mapped to the last region.
+
+        """
+        old_table = self.last.table_B
+        res = dict()
+        for loc, name in enumerate(old_table.locs):
+            res[name] = self.last.num_regions - 1
+            if name not in table_B.loc_id:
+                continue
+            new_loc = table_B.loc_id[name]
+            for region in reversed(range(self.last.num_regions)):
+                old_trans = old_table.lookup(loc, region)
+                new_trans = table_B.lookup(new_loc, region)
+                if any(old is None or new is None or old_table.locs[old[0]] != table_B.locs[new[0]]
+                       or old[1:] != new[1:] for old, new in zip(old_trans, new_trans)):
+                    break
+                res[name] = region - 1
+        return res
+
+    def equivalence_test(self, max_value, ota_B, table_B=None):
+        """Return the equivalence test of ota_A against ota_B, with the
+        successors kept from the previous test.
+
+        """
+        equiv = self.equivalence(max_value, self.ota_A, ota_B, table_A=self.table_A,
+                                 table_B=table_B, succ_cache=dict())
+        last = self.last
+        if last is not None and last.max_value == max_value:
+            changed = self.changed_regions(equiv.table_B)
+            same_locs = last.table_B.locs == equiv.table_B.locs
+            new_loc = [equiv.table_B.loc_id.get(name) for name in last.table_B.locs]
+
+            def repack(c):
+                loc_A, region_A, loc_B, region_B, flag = last.unpack(c)
+                return equiv.pack(loc_A, region_A, new_loc[loc_B], region_B, flag)
+
+            for c, succs in last.succ_cache.items():
+                _, _, loc_B, region_B, _ = last.unpack(c)
+                if region_B <= changed[last.table_B.locs[loc_B]]:
+                    continue
+                if same_locs:
+                    equiv.succ_cache[c] = succs
+                else:
+                    equiv.succ_cache[repack(c)] = [(repack(nw), num_delay, action, is_bad)
+                                                   for nw, num_delay, action, is_bad in succs]
+        self.last = equiv
+        return equiv
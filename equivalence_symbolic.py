@@ -0,0 +1,328 @@
+"""Symbolic version of equivalence test, for deterministic one-clock
+timed automata (OTAs and OCMMs).
+
+The product of the two automata is explored with zones on the two clocks,
+instead of regions. The number of regions grows linearly with the largest
+constant, while the number of zones depends on the guards that actually
+occur, so this test remains feasible for large constants.
+
+"""
+
+from collections import deque
+from decimal import Decimal
+from fractions import Fraction
+
+import ota
+
+# A bound (c, <=) is encoded as 2c+1, and a bound (c, <) as 2c, so that
+# tighter bounds have smaller codes. INF indicates the absence of a bound.
+INF = float('inf')
+LE_ZERO = 1
+
+def add_bound(a, b):
+    """Sum of two encoded bounds."""
+    if a == INF or b == INF:
+        return INF
+    return ((a >> 1) + (b >> 1)) * 2 + (a & b & 1)
+
+# Clock 0 is the reference clock (always zero), clock 1 is the clock of
+# side A, and clock 2 is the clock of side B.
+DIM = 3
+
+class DBM:
+    """Difference bound matrix on the clocks of the two sides. The entry
+    d[i*DIM+j] is the encoded bound on x_i - x_j. Operations return a new
+    DBM in canonical form, or None if the result is empty.
+
+    """
+    def __init__(self, d):
+        self.d = d
+
+    @staticmethod
+    def zero():
+        """The zone where both clocks are zero."""
+        return DBM([LE_ZERO] * (DIM * DIM))
+
+    def __eq__(self, other):
+        return self.d == other.d
+
+    def __str__(self):
+        return str(self.d)
+
+    def canonical(self):
+        """Tighten all bounds by shortest paths. Return self, or None if
+        the zone is empty.
+
+        """
+        d = self.d
+        for k in range(DIM):
+            for i in range(DIM):
+                dik = d[i*DIM+k]
+                if dik == INF:
+                    continue
+                for j in range(DIM):
+                    b = add_bound(dik, d[k*DIM+j])
+                    if b < d[i*DIM+j]:
+                        d[i*DIM+j] = b
+        if any(d[i*DIM+i] < LE_ZERO for i in range(DIM)):
+            return None
+        return self
+
+    def includes(self, other):
+        """Whether other is included in self."""
+        return all(a >= b for a, b in zip(self.d, other.d))
+
+    def up(self):
+        """Delay by any time."""
+        d = list(self.d)
+        for i in range(1, DIM):
+            d[i*DIM] = INF
+        return DBM(d)
+
+    def down(self):
+        """All valuations from which self can be reached by a delay."""
+        d = list(self.d)
+        for i in range(1, DIM):
+            d[i] = LE_ZERO
+            for j in range(1, DIM):
+                if d[j*DIM+i] < d[i]:
+                    d[i] = d[j*DIM+i]
+        return DBM(d).canonical()
+
+    def constrain(self, i, j, b):
+        """Intersect with x_i - x_j bounded by b."""
+        if b >= self.d[i*DIM+j]:
+            return self
+        d = list(self.d)
+        d[i*DIM+j] = b
+        return DBM(d).canonical()
+
+    def guard(self, clock, constraint):
+        """Intersect with constraint (an Interval) on the given clock."""
+        zone = self.constrain(0, clock, 2 * -constraint.min_value + (1 if constraint.closed_min else 0))
+        if zone is not None and constraint.max_value != '+':
+            zone = zone.constrain(clock, 0, 2 * constraint.max_value + (1 if constraint.closed_max else 0))
+        return zone
+
+    def intersect(self, other):
+        return DBM([min(a, b) for a, b in zip(self.d, other.d)]).canonical()
+
+    def reset(self, clock):
+        """Set the given clock to zero."""
+        d = list(self.d)
+        for j in range(DIM):
+            d[clock*DIM+j] = d[j]
+            d[j*DIM+clock] = d[j*DIM]
+        d[clock*DIM+clock] = LE_ZERO
+        return DBM(d)
+
+    def free(self, clock):
+        """Let the given clock take any value."""
+        d = list(self.d)
+        for j in range(DIM):
+            if j != clock:
+                d[clock*DIM+j] = INF
+                d[j*DIM+clock] = d[j*DIM]
+        return DBM(d).canonical()
+
+    def extrapolate(self, max_value):
+        """Extrapolation with the same maximal constant for both clocks.
+        The zone graph is finite under extrapolation, and reachability is
+        preserved since guards do not compare the two clocks.
+
+        """
+        d = list(self.d)
+        m = [0] + [max_value] * (DIM - 1)
+        for i in range(DIM):
+            for j in range(DIM):
+                if i == j:
+                    continue
+                if d[i*DIM+j] > 2 * m[i] + 1:
+                    d[i*DIM+j] = INF
+                elif d[i*DIM+j] < 2 * -m[j]:
+                    d[i*DIM+j] = 2 * -m[j]
+        return DBM(d).canonical()
+
+    def delay_range(self, point):
+        """Return the interval of delays t >= 0 such that point + t is in
+        the zone, as a tuple (low, closed_low, high, closed_high), where
+        high may be INF. point is a list of the values of the clocks.
+
+        """
+        low, closed_low, high, closed_high = Fraction(0), True, INF, False
+        for i in range(1, DIM):
+            upper, lower = self.d[i*DIM], self.d[i]
+            if upper != INF:
+                t = (upper >> 1) - point[i]
+                if t < high or (t == high and not upper & 1):
+                    high, closed_high = t, bool(upper & 1)
+            t = -(lower >> 1) - point[i]
+            if t > low or (t == low and not lower & 1):
+                low, closed_low = t, bool(lower & 1)
+        return low, closed_low, high, closed_high
+
+
+class SymbolicEquivalence:
+    """Equivalence test of two OTAs (or OCMMs) by breadth-first search on
+    the product of their zone graphs.
+
+    A symbolic state consists of the location of each side and a zone on
+    the two clocks. The zone records the difference between the clocks, so
+    a single state stands for many configurations of OTAEquivalence. A zone
+    is not explored if it is included in an explored zone with the same
+    locations.
+
+    The states only record the transitions taken. The concrete delays of
+    the counterexample are computed when it is reconstructed (see
+    find_path).
+
+    The arguments are the same as for OTAEquivalence. table_A and table_B
+    are accepted for compatibility and not used.
+
+    """
+    def __init__(self, max_value, ota_A, ota_B, is_ocmm=False, *, table_A=None, table_B=None):
+        assert ota_A.sigma == ota_B.sigma, "SymbolicEquivalence: OTAs must have the same actions."
+        self.max_value = max_value
+        self.ota_A = ota_A
+        self.ota_B = ota_B
+        self.sigma = ota_A.sigma
+        self.trans_A = self.compile(ota_A)
+        self.trans_B = self.compile(ota_B)
+
+    def compile(self, automaton):
+        """Return a dictionary mapping (location, action) to the list of
+        transitions as tuples (constraint, target, reset, output). For an
+        OTA, the output is whether the target is accepting.
+
+        """
+        is_ocmm = not hasattr(automaton, 'accept_states')
+        res = dict()
+        for (action, loc), trans in automaton.trans_dict.items():
+            res[(loc, action)] = [
+                (tran.constraint, tran.target, tran.reset,
+                 tran.output if is_ocmm else tran.target in automaton.accept_states)
+                for tran in trans]
+        return res
+
+    def compute_succ(self, i):
+        """Iterate over all successors of the state with id i. Each
+        successor is given as a tuple (locs, zone, step, is_bad), where
+        step = (action, tran_A, tran_B) is the pair of transitions taken
+        after a delay, and is_bad indicates that the outputs of the two
+        transitions differ.
+
+        """
+        loc_A, loc_B = self.locs[i]
+        zone = self.zones[i].up()
+        for action in self.sigma:
+            for tran_A in self.trans_A[(loc_A, action)]:
+                zone_A = zone.guard(1, tran_A[0])
+                if zone_A is None:
+                    continue
+                for tran_B in self.trans_B[(loc_B, action)]:
+                    guarded = zone_A.guard(2, tran_B[0])
+                    if guarded is None:
+                        continue
+                    if tran_A[2]:
+                        guarded = guarded.reset(1)
+                    if tran_B[2]:
+                        guarded = guarded.reset(2)
+                    yield (tran_A[1], tran_B[1]), guarded.extrapolate(self.max_value), \
+                        (action, tran_A, tran_B), tran_A[3] != tran_B[3]
+
+    def find_path(self, i):
+        """Return the timed word reaching the state with id i.
+
+        The zones of the firing valuations along the path are first
+        computed without extrapolation. They are then restricted backwards
+        to the valuations from which the rest of the path can be taken, so
+        that the delays can be chosen forwards one at a time.
+
+        """
+        steps = []
+        while i != 0:
+            steps.append(self.steps[i])
+            i = self.parent[i]
+        steps.reverse()
+
+        # Firing zones of each step
+        fire = []
+        zone = DBM.zero()
+        for action, tran_A, tran_B in steps:
+            zone = zone.up().guard(1, tran_A[0]).guard(2, tran_B[0])
+            fire.append(zone)
+            if tran_A[2]:
+                zone = zone.reset(1)
+            if tran_B[2]:
+                zone = zone.reset(2)
+
+        for k in reversed(range(len(steps) - 1)):
+            pre = fire[k+1].down()
+            for clock, tran in ((1, steps[k][1]), (2, steps[k][2])):
+                if tran[2]:
+                    pre = pre.constrain(clock, 0, LE_ZERO).free(clock)
+            fire[k] = fire[k].intersect(pre)
+
+        tws = []
+        point = [Fraction(0)] * DIM
+        for (action, tran_A, tran_B), zone in zip(steps, fire):
+            low, closed_low, high, closed_high = zone.delay_range(point)
+            if closed_low:
+                time = low
+            elif high == INF:
+                time = low + Fraction(1, 2)
+            else:
+                time = (low + high) / 2
+            point = [point[0]] + [v + time for v in point[1:]]
+            for clock, tran in ((1, tran_A), (2, tran_B)):
+                if tran[2]:
+                    point[clock] = Fraction(0)
+            tws.append(ota.TimedWord(action, Decimal(time.numerator) / Decimal(time.denominator)))
+        return tuple(tws)
+
+    def add_state(self, locs, zone, parent, step):
+        """Add the state (locs, zone), reached from parent by step, to the
+        side arrays. Return its id.
+
+        """
+        self.locs.append(locs)
+        self.zones.append(zone)
+        self.parent.append(parent)
+        self.steps.append(step)
+        return len(self.locs) - 1
+
+    def find_counterexamples(self, limit=1):
+        """Return a list of at most limit counterexamples, in order of
+        increasing length, as in OTAEquivalence.find_counterexamples.
+
+        """
+        self.locs, self.zones, self.parent, self.steps = [], [], [], []
+        init_locs = (self.ota_A.init_state, self.ota_B.init_state)
+        self.add_state(init_locs, DBM.zero(), None, None)
+        to_explore = deque([0])
+        passed = {init_locs: [DBM.zero()]}
+        bad = dict()
+
+        while to_explore:
+            i = to_explore.popleft()
+            for locs, zone, step, is_bad in self.compute_succ(i):
+                if is_bad:
+                    if locs not in bad:
+                        bad[locs] = self.add_state(locs, zone, i, step)
+                        if len(bad) == limit:
+                            return [self.find_path(j) for j in bad.values()]
+                    continue
+
+                zones = passed.setdefault(locs, [])
+                if any(explored.includes(zone) for explored in zones):
+                    continue
+                zones.append(zone)
+                to_explore.append(self.add_state(locs, zone, i, step))
+
+        return [self.find_path(j) for j in bad.values()]
+
+    def test_equivalent(self):
+        ctxs = self.find_counterexamples(1)
+        if ctxs:
+            return False, ctxs[0]
+        return True, None
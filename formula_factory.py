@@ -0,0 +1,82 @@
+"""Construction of the formulas given to the solver by findReset.
+
+The same reset assignment occurs in the formulas of many pairs of rows,
+and the same formula may be produced several times. FormulaFactory
+interns the formula of each reset assignment, and drops formulas already
+given to the solver.
+
+The formula of a reset assignment is the conjunction of its literals
+rather than an auxiliary variable defined once: on the benchmarks, only
+about a fifth of the assignments occur more than once, and the auxiliary
+variables made solving about 10% slower.
+
+"""
+
+import z3
+
+
+class FormulaFactory:
+    def __init__(self):
+        # Formula for each reset assignment, indexed by the ids of its
+        # literals, and the list of (literals, formula).
+        self.reset_formula = dict()
+        self.reset_terms = []
+
+        # Formulas already given to the solver, indexed by id.
+        self.added = dict()
+
+    def __getstate__(self):
+        # The ids of z3 terms change when a checkpoint is loaded, so only
+        # the terms are stored, and the indices are rebuilt.
+        return {
+            "reset_terms": self.reset_terms,
+            "added": list(self.added.values()),
+        }
+
+    def __setstate__(self, state):
+        self.reset_terms = state["reset_terms"]
+        self.reset_formula = dict()
+        for lits, f in self.reset_terms:
+            self.reset_formula[frozenset(lit.get_id() for lit in lits)] = f
+        self.added = dict((f.get_id(), f) for f in state["added"])
+
+    def encodeReset(self, reset, resets_var):
+        """Return the formula saying that each row in reset has the given
+        reset, where resets_var maps rows to reset variables (or constants).
+        Rows sharing a variable are merged, and constants are evaluated.
+
+        """
+        assert len(reset) > 0, "Invalid resets!"
+        lits = dict()
+        polarity = dict()
+        for row, r in reset.items():
+            v = resets_var[row]
+            if z3.is_true(v) or z3.is_false(v):
+                if z3.is_true(v) != r:
+                    return z3.BoolVal(False)
+                continue
+            if polarity.setdefault(v.get_id(), r) != r:
+                return z3.BoolVal(False)
+            lit = v if r else z3.Not(v)
+            lits[lit.get_id()] = lit
+
+        if not lits:
+            return z3.BoolVal(True)
+        if len(lits) == 1:
+            return lit
+
+        key = frozenset(lits)
+        if key not in self.reset_formula:
+            f = z3.And(*lits.values())
+            self.reset_formula[key] = f
+            self.reset_terms.append((tuple(lits.values()), f))
+        return self.reset_formula[key]
+
+    def newFormulas(self, formulas):
+        """Return the formulas not given to the solver before."""
+        res = []
+        for f in formulas:
+            if f.get_id() not in self.added:
+                self.added[f.get_id()] = f
+                res.append(f)
+        return res
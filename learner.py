@@ -196,79 +196,133 @@ class Learner:
         foundR is a mapping from keys in S and R to keys in S (or the sink)
         that can correspond to the same location.
 
-        If fails, then resets is None.
+        If fails, then resets is None, and foundR maps each non-sink key
+        in R to the number of times it was matched to a key in S.
 
         """
         # Take a guess for each nonempty key in S and each key in R that
         # is not a sink.
         non_sink_R = dict((twR, infoR) for twR, infoR in self.R.items()
                           if not infoR.is_sink)
-        num_guess = len(self.S) + len(non_sink_R) - 1
 
         # For each non-sink R, find the number of times with match in S.
         foundR_count = dict()
         for twR in non_sink_R:
             foundR_count[twR] = 0
 
-        # Iterate over the guesses.
-        for num in range(2 ** num_guess):
-            # List of booleans corresponding to the current guess.
-            guesses = [b for b in bin(num)[2:].zfill(num_guess)]
-
-            # Get the dictionary mapping timed words to guesses.
-            resets = dict()
-            for i, twS in enumerate(sorted(self.S)):
-                if twS != ():
-                    resets[twS] = False if guesses[i-1] == '0' else True
-            for i, twR in enumerate(sorted(non_sink_R)):
-                resets[twR] = False if guesses[i+len(self.S)-1] == '0' else True
-
-            # Form the mapping from S and R to S. First, fill in the
-            # obvious cases.
-            foundR = dict()
-            for twS in self.S:
-                foundR[twS] = twS
-            for twR, infoR in self.R.items():
-                if infoR.is_sink:
-                    foundR[twR] = 'sink'
-
-            # Now consider the remaining cases. For each R, and for each S,
-            # find the time values under the current guess of resets. Then
-            # compare using the timed words in E after performing the required
-            # shifts.
-            for twR, infoR in non_sink_R.items():
-                foundR[twR] = None
-                for twS, infoS in self.S.items():
-                    suffix = self.findDistinguishingSuffix(infoR, infoS, resets)
+        while True:
+            resets, foundR = self.searchResets(non_sink_R, foundR_count)
+            if resets is None:
+                # Cannot find a guess.
+                return None, foundR_count
 
-                    if suffix is None:
-                        foundR[twR] = twS
-                        foundR_count[twR] += 1
-                        break
+            # Check consistency of the resulting table. If inconsistent,
+            # the new suffix changes the mapping, so search again.
+            newE = self.checkConsistent(resets, foundR)
+            if not newE:
+                return resets, foundR
+            self.E.append(newE)
 
-            # Check if all rows in R can be mapped
-            if not all(foundR[twR] is not None for twR in foundR):
-                continue
+    def searchResets(self, non_sink_R, foundR_count):
+        """Search for resets such that every key in R can be mapped to a key
+        in S, and the checks of checkForbiddenPairs and checkInvalidRow hold.
 
-            # Check if the mapping contains forbidden pairs
-            if not self.checkForbiddenPairs(resets, foundR):
-                continue
+        The resets are assigned by a depth-first search, one key at a time
+        in prefix order (nonempty keys of S, then non-sink keys of R, each
+        sorted), trying False before True. The time value and the mapping of
+        a key only depend on the resets of its prefixes and of S, so they
+        are computed when the key is assigned, together with the checks on
+        pairs of keys assigned so far. A branch is pruned as soon as a key
+        cannot be mapped or a check fails.
 
-            # Check if the mapping contains invalid rows
-            if not self.checkInvalidRow(resets, foundR):
-                continue
+        Returns a tuple (resets, foundR), which is (None, None) if no
+        setting of resets is found.
 
-            # Check consistency of the resulting table
-            newE = self.checkConsistent(resets, foundR)
-            if newE:
-                self.E.append(newE)
+        """
+        order = [tws for tws in sorted(self.S) if tws != ()] + sorted(non_sink_R)
+        rows = dict(self.S)
+        rows.update(self.R)
+
+        resets = dict()
+        foundR = dict()
+        for twS in self.S:
+            foundR[twS] = twS
+        for twR, infoR in self.R.items():
+            if infoR.is_sink:
+                foundR[twR] = 'sink'
+
+        # Value of the clock at the end of each assigned key.
+        time_vals = {(): 0}
+
+        # Assigned keys for each action, and keys with known mapping for
+        # each pair (prefix, action).
+        by_action = dict((act, []) for act in self.actions)
+        children = dict()
+        for twR, infoR in self.R.items():
+            if infoR.is_sink and twR != ():
+                children.setdefault((twR[:-1], twR[-1].action), []).append(twR)
+
+        def check(tws):
+            """Compute the time value and mapping of tws, and check the pairs
+            of tws with keys assigned before.
+
+            """
+            time_vals[tws] = rows[tws].getTimeVal(resets)
+            if tws not in self.S:
+                foundR[tws] = None
+                for twS, infoS in self.S.items():
+                    if self.findDistinguishingSuffix(rows[tws], infoS, resets) is None:
+                        foundR[tws] = twS
+                        foundR_count[tws] += 1
+                        break
+                if foundR[tws] is None:
+                    return False
+
+            prev, tw = tws[:-1], tws[-1]
+            time_val = tw.time + time_vals[prev]
+
+            # Forbidden pairs (see checkForbiddenPairs).
+            for tws2 in by_action[tw.action]:
+                if resets[tws] != resets[tws2] and foundR[prev] == foundR[tws2[:-1]] and \
+                    isSameRegion(time_val, tws2[-1].time + time_vals[tws2[:-1]]):
+                    return False
+
+            # Invalid rows (see checkInvalidRow).
+            for tws2 in children.get((prev, tw.action), []):
+                if foundR[tws] != foundR[tws2] and \
+                    isSameRegion(time_val, tws2[-1].time + time_vals[prev]):
+                    return False
+
+            return True
+
+        # The search is iterative, so that it is not limited by the depth
+        # of recursion. Each entry (i, reset) of the stack is an assigned
+        # key order[i] with its reset. Assigned keys are in by_action and
+        # children, and are removed from them when popped.
+        stack = []
+        i, reset = 0, False
+        while i < len(order):
+            tws = order[i]
+            resets[tws] = reset
+            if check(tws):
+                by_action[tws[-1].action].append(tws)
+                children.setdefault((tws[:-1], tws[-1].action), []).append(tws)
+                stack.append((i, reset))
+                i, reset = i+1, False
                 continue
 
-            # After all validity checks, return results
-            return resets, foundR
-
-        # Cannot find a guess.
-        return None, foundR_count
+            # Backtrack to the last key for which True is not tried yet.
+            while reset:
+                del resets[order[i]]
+                if not stack:
+                    return None, None
+                i, reset = stack.pop()
+                tws = order[i]
+                by_action[tws[-1].action].pop()
+                children[(tws[:-1], tws[-1].action)].pop()
+            reset = True
+
+        return resets, foundR
 
     def checkForbiddenPairs(self, resets, foundR):
         """Check validity of reset information.
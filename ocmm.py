@@ -69,6 +69,8 @@ class OCMM:
         self.query1 = {tuple(): (None, 1)}
         # For reset query
         self.query2 = {tuple(): (None, 1)}
+        # Resets reported by runTimedWordReset
+        self.query_reset = {tuple(): tuple()}
         # Record #membership query
         # Create index of transitions
         self.trans_dict = dict()
@@ -175,6 +177,38 @@ class OCMM:
         self.query1[itws] = (out, sink)
         return self.query1[itws]
 
+    def runTimedWordReset(self, itws):
+        """Execute the given timed word over inputs, also reporting the
+        clock resets.
+        itws : list of TimedWord over inputs.
+        Return a pair (res, resets), where res is the result of runTimedWord,
+        and resets is a tuple of booleans indicating whether the transition
+        taken at each input resets the clock. Steps going to the sink are
+        considered as resets.
+        """
+        res = self.runTimedWord(itws)
+        if itws not in self.query_reset:
+            resets = []
+            cur_state, cur_time = self.init_state, 0
+            for itw in itws:
+                output = None
+                if cur_state is not None:
+                    for tran in self.trans:
+                        output = tran.pass_input(cur_state, itw.action, cur_time + itw.time)
+                        if output is not None:
+                            cur_state = tran.target
+                            if tran.reset:
+                                cur_time = 0
+                            else:
+                                cur_time += itw.time
+                            resets.append(tran.reset)
+                            break
+                if output is None: # not complete transition
+                    cur_state = None
+                    resets.append(True)
+            self.query_reset[itws] = tuple(resets)
+        return res, self.query_reset[itws]
+
 def buildOCMM(jsonfile):
     """Build the teacher OTA from a json file."""
     with open(jsonfile, 'r') as f:
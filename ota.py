@@ -130,6 +130,9 @@ class OTA:
         # store the runTimedWord result
         self.query = dict()
 
+        # store the resets reported by runTimedWordReset
+        self.query_reset = dict()
+
     def __str__(self):
         res = ""
         
@@ -191,6 +194,40 @@ class OTA:
         self.query[tws] = result
         return result
 
+    def runTimedWordReset(self, tws):
+        """Execute the given timed words, also reporting the clock resets.
+
+        tws : list(TimedWord)
+
+        Returns a pair (res, resets), where res is the result of runTimedWord,
+        and resets is a tuple of booleans indicating whether the transition
+        taken at each timed word resets the clock. Steps going to the sink
+        are considered as resets.
+
+        """
+        res = self.runTimedWord(tws)
+        if tws not in self.query_reset:
+            resets = []
+            cur_state, cur_time = self.init_state, 0
+            for tw in tws:
+                moved = False
+                if cur_state is not None:
+                    for tran in self.trans:
+                        if tran.is_pass(cur_state, tw.action, cur_time + tw.time):
+                            cur_state = tran.target
+                            if tran.reset:
+                                cur_time = 0
+                            else:
+                                cur_time += tw.time
+                            resets.append(tran.reset)
+                            moved = True
+                            break
+                if not moved:
+                    cur_state = None
+                    resets.append(True)
+            self.query_reset[tws] = tuple(resets)
+        return res, self.query_reset[tws]
+
 
 def OTAToJSON(ota, file_name):
     """Convert an OTA to a json file."""
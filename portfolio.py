@@ -0,0 +1,147 @@
+"""Portfolio of solver configurations for findReset.
+
+The time to solve the same problem can vary by orders of magnitude
+between z3 tactics and random seeds. solve_portfolio solves an SMT-LIB
+problem in one worker process per configuration, and returns the first
+answer.
+
+Configurations (CONFIGS):
+
+- "default": z3.Solver with default settings.
+- "seedN": z3.Solver with random seed N.
+- "sat": tactic translating bounded integers to bit-vectors and solving
+  the result with the SAT solver.
+- "preprocess": tactic eliminating the variables fixed by equalities
+  before the default SMT core.
+
+The constraints cannot be re-encoded after export, so alternative state
+encodings are chosen with the encoding option of the learner instead.
+
+"""
+
+import multiprocessing
+from multiprocessing.connection import wait
+
+import z3
+
+CONFIGS = ["default", "seed1", "seed2", "sat", "preprocess"]
+
+
+def make_solver(config, ctx):
+    """Return a solver in context ctx for the given configuration."""
+    if config == "default":
+        return z3.Solver(ctx=ctx)
+    elif config.startswith("seed"):
+        solver = z3.Solver(ctx=ctx)
+        solver.set("random_seed", int(config[len("seed"):]))
+        return solver
+    elif config == "sat":
+        # Bounded integers (if any) are translated to bit-vectors by nla2bv.
+        tactic = z3.Then("simplify", "propagate-values", "solve-eqs",
+                         z3.OrElse(z3.Tactic("nla2bv", ctx=ctx), z3.Tactic("skip", ctx=ctx), ctx=ctx),
+                         "bit-blast", "sat", ctx=ctx)
+        return tactic.solver()
+    elif config == "preprocess":
+        tactic = z3.Then("simplify", "propagate-values", "solve-eqs", "smt", ctx=ctx)
+        return tactic.solver()
+    else:
+        raise ValueError("Unknown solver configuration %s" % config)
+
+def model_values(model):
+    """Return a dictionary mapping the name of each constant in model to
+    its value (bool or int).
+
+    """
+    values = dict()
+    for d in model.decls():
+        if d.arity() == 0:
+            v = model[d]
+            if z3.is_true(v) or z3.is_false(v):
+                values[d.name()] = z3.is_true(v)
+            elif z3.is_int_value(v) or z3.is_bv_value(v):
+                values[d.name()] = v.as_long()
+    return values
+
+def solve(text, config):
+    """Solve the SMT-LIB problem text with the given configuration.
+
+    Return a tuple (res, values), where res is "sat", "unsat" or "unknown",
+    and values is the result of model_values for "sat".
+
+    """
+    ctx = z3.Context()
+    try:
+        solver = make_solver(config, ctx)
+        solver.add(z3.parse_smt2_string(text, ctx=ctx))
+        res = solver.check()
+    except z3.Z3Exception:
+        return "unknown", None
+    if res == z3.sat:
+        return "sat", model_values(solver.model())
+    return str(res), None
+
+def _worker(text, config, conn):
+    conn.send(solve(text, config))
+    conn.close()
+
+def solve_portfolio(text, configs=None):
+    """Solve the SMT-LIB problem text with each configuration in configs
+    (by default CONFIGS) in parallel, and return the first answer that is
+    not "unknown" as (res, values, config). The other workers are stopped.
+
+    """
+    if configs is None:
+        configs = CONFIGS
+    mp = multiprocessing.get_context("fork")
+    workers = dict()
+    for config in configs:
+        recv_conn, send_conn = mp.Pipe(duplex=False)
+        p = mp.Process(target=_worker, args=(text, config, send_conn), daemon=True)
+        p.start()
+        send_conn.close()
+        workers[recv_conn] = (p, config)
+
+    res, values, winner = "unknown", None, None
+    try:
+        pending = list(workers)
+        while pending:
+            for conn in wait(pending):
+                pending.remove(conn)
+                try:
+                    res, values = conn.recv()
+                except EOFError:
+                    continue
+                if res != "unknown":
+                    winner = workers[conn][1]
+                    return res, values, winner
+        return res, values, winner
+    finally:
+        for conn, (p, _) in workers.items():
+            if p.is_alive():
+                p.terminate()
+            p.join()
+            conn.close()
+
+
+class PortfolioModel:
+    """Model given by the values returned from solve_portfolio, with the
+    part of the interface of z3.ModelRef used by findReset.
+
+    """
+    def __init__(self, values):
+        self.values = values
+
+    def eval(self, e, model_completion=False):
+        """Evaluate a constant e. Constants missing from the model take the
+        default value (False or 0).
+
+        """
+        if z3.is_true(e) or z3.is_false(e):
+            return e
+        v = self.values.get(e.decl().name())
+        if z3.is_bool(e):
+            return z3.BoolVal(bool(v))
+        elif z3.is_bv(e):
+            return z3.BitVecVal(v or 0, e.size())
+        else:
+            return z3.IntVal(v or 0)
@@ -0,0 +1,25 @@
+#!/bin/bash
+
+# Compare the state encodings, e.g. ./run_encoding.sh 3_2_10
+# Results can be found in "./result/3_2_10_<encoding>.txt"
+
+if [ ! -d result ]; then
+mkdir result
+fi
+
+configs=$(python -c "import stats; print(' '.join(c for c, _ in stats.ENCODING_CONFIGS))")
+
+for c in $configs
+do
+> ./result/$1_$c.txt # clear file
+done
+
+for i in $(seq 1 10) # iterate files
+do
+python stats.py encoding $1 $1-$i.json
+done
+
+for c in $configs
+do
+python -c "import stats; stats.analyze(\""./result/$1_$c.txt"\")"
+done
@@ -2,9 +2,18 @@ import pprint
 from ota import Location, TimedWord, OTA, OTATran, buildAssistantOTA, OTAToJSON, OTAToDOT
 from interval import Interval
 from equivalence import ota_equivalent
-from equivalence_simple import OTAEquivalence
+from equivalence_simple import OTAEquivalence, TransitionTable, IncrementalEquivalence
+from equivalence_symbolic import SymbolicEquivalence
+from checkpoint import save_checkpoint, load_checkpoint, restore_options
+from state_encoding import STATE_ENCODINGS
+from formula_factory import FormulaFactory
+from portfolio import solve_portfolio, PortfolioModel
 import copy
+import os
+import json
+import time
 import z3
+from decimal import Decimal
 from os.path import commonprefix
 
 TT, TF, FT, FF = range(4)
@@ -166,10 +175,55 @@ class TestSequence:
 
 class Learner:
     """Represents the state of the learner."""
-    def __init__(self, ota):
+    def __init__(self, ota, reset_observable=False, lazy_successors=False, encoding="int",
+                 symmetry_breaking=False, portfolio=None, portfolio_delay=1.0, dump_dir=None,
+                 phase_hints=False):
         self.ota = ota
         self.actions = ota.sigma
 
+        # Whether the teacher reports clock resets (runTimedWordReset). In
+        # that case the reset of each row is a constant rather than a
+        # variable, and only the actual pair of last resets of two rows
+        # needs to be considered.
+        self.reset_observable = reset_observable
+
+        # Whether successor rows tws + (act, 0) of rows in S and extra_S that
+        # go immediately to the sink are deferred. Such rows are kept in
+        # pending (mapping to the query result), and only added to R when
+        # the candidate would contradict them (see materializePending).
+        self.lazy_successors = lazy_successors
+        self.pending = dict()
+
+        # Encoding of the state of each row (see state_encoding), and
+        # whether to break the symmetry between locations not fixed by S.
+        self.encoding = STATE_ENCODINGS[encoding]()
+        self.encoding_name = encoding
+
+        # Interns reset assignments and drops duplicate formulas.
+        self.formulas = FormulaFactory()
+
+        # Solver configurations tried in parallel (see portfolio) when the
+        # incremental solver takes more than portfolio_delay seconds.
+        self.portfolio = portfolio
+        self.portfolio_delay = portfolio_delay
+
+        # Directory where each query of findReset is written as an SMT-LIB
+        # file (see dumpQuery), the number of queries written, and the
+        # current step of the learning loop, for their metadata.
+        self.dump_dir = dump_dir
+        self.dump_num = 0
+        self.step = 0
+
+        # Whether the resets and states of the last model are given to the
+        # solver as initial values for the next call to findReset.
+        self.phase_hints = phase_hints
+
+        # Statistics of the last call to findReset (see findReset), and the
+        # time that call returned.
+        self.call_stats = None
+        self.last_call_end = time.perf_counter()
+        self.symmetry_breaking = symmetry_breaking
+
         # Store the comparision result of tw1 and tw2 on a 
         # given reset which is represented by a pair (i, j)
         self.cache = dict()
@@ -190,6 +244,11 @@ class Learner:
         # Mapping from rows to resets and states name
         self.reset_name = dict()
 
+        # All sink rows behave the same, so they share a single reset
+        # variable and a single state variable.
+        self.sink_reset_name = z3.BoolVal(True) if reset_observable else z3.Bool("r_sink")
+        self.sink_state_name = self.encoding.sink
+
         # List of discriminator sequences
         self.E = []
 
@@ -204,6 +263,11 @@ class Learner:
         #   suffixes, under the given reset.
         self.constraint1_triple = []
 
+        # Graph of the rows that must be in different states under any
+        # resets (the unconditional formulas in constraint1), used for a
+        # lower bound on the number of locations.
+        self.distinct = dict()
+
         # Store the formulas in constraint 2: 
         self.constraint2_formula = []
         self.constraint2_formula_num = 0
@@ -215,9 +279,6 @@ class Learner:
         # Store the (tw1, tw2, reset) triple in which both tw1[:-1] == tw2[:-1] and tw1 == tw2
         self.constraint4_triple1 = []
 
-        # Store sink constraints
-        self.sink_constraint = set()
-
         self.addPath(())
 
         # Count the number of occurrence
@@ -226,12 +287,40 @@ class Learner:
         # Store the query result
         self.query_result = dict()
 
-        # Incremental solver
-        self.solver = z3.Solver()
+        # Incremental solver. All constraints are added to its base scope,
+        # the number of locations and the condition on extra_S are enabled
+        # by assumption literals passed to check(). Initial values are only
+        # supported by the SMT core, which is what z3.Solver uses for checks
+        # under assumptions anyway.
+        self.solver = z3.SimpleSolver() if phase_hints else z3.Solver()
+
+        # Assumption literals enforcing the condition on extra_S, indexed by
+        # (state_num, len(S), len(extra_S)). S and extra_S only grow.
+        self.extra_S_literal = dict()
+
+        # Subset of the assumptions of the last unsat check, if known, and
+        # whether it may depend on the condition on extra_S. The sizes of
+        # all unsat cores are kept for profiling.
+        self.unsat_core = None
+        self.extra_S_in_core = True
+        self.core_sizes = []
+
+        # Number of rows of S whose state is fixed in the solver.
+        self.pinned_num = 0
+
+        self.solver.add(*self.setSinkRowReset())
 
         # Record the full constraint1
         self.full_constraint1 = []
 
+    def __setstate__(self, state):
+        # A checkpoint restores the assertions into a z3.Solver, which does
+        # not accept initial values.
+        self.__dict__.update(state)
+        if state.get("phase_hints"):
+            self.solver = z3.SimpleSolver()
+            self.solver.add(*state["solver"].assertions())
+
     def __str__(self):
         res = 'R:\n'
         for twR, info in sorted(self.R.items()):
@@ -259,23 +348,34 @@ class Learner:
         constriant1, constraint2, and constraint4.
 
         """
-        # Create two z3 variables: r_n is a boolean variable for whether
-        # there is reset following tws. s_n is an integer variable for
-        # the assignment of the current state.
-        self.reset_name[tws] = z3.Bool("r_%d" % len(self.R))
-        self.state_name[tws] = z3.Int("s_%d" % len(self.R))
+        self.pending.pop(tws, None)
+
         sequence = TestSequence(tws, res)
 
+        # Create two z3 variables: r_n is a boolean variable for whether
+        # there is reset following tws. s_n is the state of the row, given
+        # by the state encoding. Sink rows share r_sink and the sink state.
+        if sequence.is_sink:
+            self.reset_name[tws] = self.sink_reset_name
+            self.state_name[tws] = self.sink_state_name
+        else:
+            if self.reset_observable:
+                self.reset_name[tws] = z3.BoolVal(self.knownReset(tws))
+            else:
+                self.reset_name[tws] = z3.Bool("r_%d" % len(self.R))
+            self.state_name[tws] = self.encoding.newState("s_%d" % len(self.R))
+
         # Compare the new row with each of the existing rows. For each
         # existing row that can be distinguished from the new row under some
         # resets, add the corresponding constraint1. Otherwise, record the
-        # inability to distinguish to constraint1_triple.
-        for row in self.R:
-            if not sequence.is_sink and not self.R[row].is_sink:
+        # inability to distinguish to constraint1_triple. Sink rows are
+        # never compared here.
+        for row in (self.R if not sequence.is_sink else ()):
+            if not self.R[row].is_sink:
                 if sequence.is_accept != self.R[row].is_accept:
-                    self.constraint1_formula.append(self.state_name[row] != self.state_name[tws])
+                    self.constraint1_formula.append(self.addDistinct(row, tws))
                 else:
-                    pairs = generate_pair(row, tws)
+                    pairs = self.generatePairs(row, tws)
                     test_res = dict()
                     test_row = dict()
                     test_col = dict()
@@ -294,14 +394,14 @@ class Learner:
                             test_col[j][i] = res
                         test_res[(i, j)] = res
                     if all(res for _, res in test_res.items()):
-                        self.constraint1_formula.append(self.state_name[row] != self.state_name[tws])
+                        self.constraint1_formula.append(self.addDistinct(row, tws))
                     else:
                         # If all j can be distinguished by a specific i
                         for i in test_row:
                             if all(res for _, res in test_row[i].items()):
                                 row_i_reset = generate_reset_at_i(row, i)
                                 row_f = z3.Implies(self.encodeReset(row_i_reset, self.reset_name),
-                                                self.state_name[row] != self.state_name[tws])
+                                                self.encoding.different(self.state_name[row], self.state_name[tws]))
                                 self.constraint1_formula.append(row_f)
 
                                 # Delete used pairs
@@ -312,7 +412,7 @@ class Learner:
                             if all(res for _, res in test_col[j].items()):
                                 col_j_reset = generate_reset_at_i(tws, j)
                                 col_f = z3.Implies(self.encodeReset(col_j_reset, self.reset_name),
-                                                self.state_name[row] != self.state_name[tws])
+                                                self.encoding.different(self.state_name[row], self.state_name[tws]))
                                 self.constraint1_formula.append(col_f)
                                 # spec_col.append(self.encodeReset(col_j_reset, self.reset_name))
                                 for ii, jj in list(test_res.keys()):
@@ -322,7 +422,7 @@ class Learner:
                             reset = generate_reset_at_ij(row, tws, i, j)
                             if res:
                                 f = z3.Implies(self.encodeReset(reset, self.reset_name),
-                                               self.state_name[row] != self.state_name[tws])
+                                               self.encoding.different(self.state_name[row], self.state_name[tws]))
                                 self.constraint1_formula.append(f)
                             else:
                                 self.constraint1_triple.append((row, tws, reset, i, j))
@@ -330,19 +430,30 @@ class Learner:
         new_Es = []
         for row in self.R:
             # For each existing row whose last action equals the new row.
+            # Two sink rows always share the same state, so there is
+            # nothing to compare.
+            row_sink = self.R[row].is_sink
+            if row_sink and sequence.is_sink:
+                continue
             if row != () and tws != () and row[-1].action == tws[-1].action:
-                pairs = generate_pair(row[:-1], tws[:-1])
+                pairs = self.generatePairs(row[:-1], tws[:-1])
                 # possible_resets = generate_row_resets_enhance(row, tws)
                 # for reset in possible_resets:
                 for i, j in pairs:
-                    for b in range(4):
+                    for b in self.generateResetBits(row, tws):
                         # reset = generate_row_resets_enhance1(row, tws, i, j, b)
                         reset = generate_reset_at_ij_enhance(row, tws, i, j, b)
+                        # If one row is the prefix of the other, its reset bit b
+                        # must agree with the last resets i and j of the prefixes
+                        # (results of findDistinguishingSuffix are cached by i, j).
+                        prefix_reset = generate_reset_at_ij(row[:-1], tws[:-1], i, j)
+                        if any(reset[tw] != prefix_reset[tw] for tw in prefix_reset):
+                            continue
                         if self.findDistinguishingSuffix(self.R[row[:-1]], self.R[tws[:-1]], reset, i, j) is None:
                             time_val1 = self.R[row[:-1]].getTimeVal(reset)
                             time_val2 = self.R[tws[:-1]].getTimeVal(reset)
                             if isSameRegion(time_val1+row[-1].time, time_val2+tws[-1].time):
-                                f = z3.Implies(self.state_name[row[:-1]] == self.state_name[tws[:-1]],
+                                f = z3.Implies(self.encoding.same(self.state_name[row[:-1]], self.state_name[tws[:-1]]),
                                             z3.Not(self.encodeReset(reset, self.reset_name)))
                                 # If reached the same time region, then the two states being the same
                                 # implies the two resets must be the same. Add the corresponding formula
@@ -369,9 +480,9 @@ class Learner:
                                 # if row[:-1] and tws[:-1] are mapped to the same state, then under the
                                 # given reset row and tws are also mapped to the same reset.
                                 else:
-                                    f2 = z3.Implies(z3.And(self.state_name[row[:-1]] == self.state_name[tws[:-1]],
+                                    f2 = z3.Implies(z3.And(self.encoding.same(self.state_name[row[:-1]], self.state_name[tws[:-1]]),
                                                         self.encodeReset(reset, self.reset_name)),
-                                                    self.state_name[row] == self.state_name[tws])
+                                                    self.encoding.same(self.state_name[row], self.state_name[tws]))
                                     self.constraint4_formula2.append(f2)
                                     # E is increasing, row and tws are possible to be distinguished in t future, 
                                     # so store (row, tws, reset) in constraint4_triple1
@@ -401,7 +512,7 @@ class Learner:
         for tw1, tw2, reset, i, j in self.constraint1_triple:
             if self.findDistinguishingSuffix(self.R[tw1], self.R[tw2], reset, i, j, suffix) is not None:
                 f = z3.Implies(self.encodeReset(reset, self.reset_name),
-                               self.state_name[tw1] != self.state_name[tw2])
+                               self.encoding.different(self.state_name[tw1], self.state_name[tw2]))
                 self.constraint1_formula.append(f)
                 delete_items.append((tw1, tw2, reset, i, j))
 
@@ -417,7 +528,7 @@ class Learner:
                 if isSameRegion(time_val1+tw1[-1].time, time_val2+tw2[-1].time):
                     s = self.findDistinguishingSuffix(self.R[tw1], self.R[tw2], reset, i, j, suffix, b)
                     if s is not None:
-                        f = z3.Implies(self.state_name[tw1[:-1]] == self.state_name[tw2[:-1]],
+                        f = z3.Implies(self.encoding.same(self.state_name[tw1[:-1]], self.state_name[tw2[:-1]]),
                                        z3.Not(self.encodeReset(reset, self.reset_name)))
                         self.constraint4_formula1.append(f)
                         delete_items.append((tw1, tw2, reset, i, j, b))
@@ -430,13 +541,13 @@ class Learner:
         # all possible resets.
         delete_items = []
         for tw1 in self.R:
-            if tw1 in self.S:
+            if tw1 in self.S or self.R[tw1].is_sink:
                 continue
             is_new_state = True
             for tw2 in list(self.S.keys())+delete_items:
                 # possible_resets = generate_reset_rows(tw1, tw2)
                 # for reset in possible_resets:
-                for (i, j) in generate_pair(tw1, tw2):
+                for (i, j) in self.generatePairs(tw1, tw2):
                     reset = generate_reset_at_ij(tw1, tw2, i, j)
                     if self.findDistinguishingSuffix(self.R[tw1], self.R[tw2], reset, i, j, suffix) is None:
                         is_new_state = False
@@ -464,7 +575,7 @@ class Learner:
         if self.ota.runTimedWord(tws) != -1:
             for act in self.actions:
                 cur_tws = tws + (TimedWord(act, 0),)
-                if cur_tws not in self.R:
+                if cur_tws not in self.R and not self.deferSuccessor(cur_tws):
                     self.addPath(cur_tws)
 
     def addPossibleS(self, tws):
@@ -481,9 +592,55 @@ class Learner:
             for act in self.actions:
                 new_tws = tws + (TimedWord(act, 0),)
                 new_res = self.ota.runTimedWord(new_tws)
-                if new_tws not in self.R:
+                if new_tws not in self.R and not self.deferSuccessor(new_tws):
                     self.addRow(new_tws, new_res)
 
+    def deferSuccessor(self, tws):
+        """With lazy_successors, probe the successor row tws and record it in
+        pending if it goes immediately to the sink.
+
+        Return whether tws is deferred.
+
+        """
+        if not self.lazy_successors:
+            return False
+        res = self.ota.runTimedWord(tws)
+        if res == -1:
+            self.pending[tws] = res
+            return True
+        return False
+
+    def materializePending(self, resets, states):
+        """Add to R the pending rows contradicted by the candidate built from
+        resets and states. A pending row is contradicted if, in the state of
+        its prefix, the transition taken at its time is given by a non-sink
+        row with the same action (at an earlier time, or in the same region).
+
+        Return whether any row is added.
+
+        """
+        # Mapping from (state, action) to the list of (time, is_sink) of
+        # the transitions given by rows in R.
+        known = dict()
+        for row in self.R:
+            if row != ():
+                t = self.R[row[:-1]].getTimeVal(resets) + row[-1].time
+                known.setdefault((states[row[:-1]], row[-1].action), []).append((t, self.R[row].is_sink))
+
+        contradicted = []
+        for tws in self.pending:
+            t = self.R[tws[:-1]].getTimeVal(resets) + tws[-1].time
+            trans = [(t2, is_sink) for t2, is_sink in known.get((states[tws[:-1]], tws[-1].action), [])
+                     if t2 <= t or isSameRegion(t2, t)]
+            if trans:
+                last_time = max(t2 for t2, _ in trans)
+                if not all(is_sink for t2, is_sink in trans if t2 == last_time):
+                    contradicted.append(tws)
+
+        for tws in contradicted:
+            self.addRow(tws, self.pending[tws])
+        return len(contradicted) > 0
+
     def addPath(self, tws):
         """Add the given path tws (and its prefixes) to R.
         
@@ -506,6 +663,70 @@ class Learner:
             if cur_res == -1:
                 break
 
+    def addHypothesis(self, hypothesis):
+        """Seed the table from a previously learned hypothesis.
+
+        The characterizing suffixes of the hypothesis, together with the last
+        step of each transition word (which tests the clock value against the
+        guards), are added to E. Then the access sequences and transition
+        words are added to R. All rows are filled in using membership
+        queries, so the seeds are checked against the current system, not
+        taken from the hypothesis.
+
+        Return the list of seeded words.
+
+        """
+        access, trans_words = hypothesis_words(hypothesis)
+        suffixes = hypothesis_suffixes(hypothesis, access)
+        suffixes.extend(sorted(set(tws[-1:] for tws in trans_words)))
+        for suffix in suffixes:
+            self.addSuffix(suffix)
+
+        seeds = sorted(set(access.values()) | set(trans_words), key=lambda tws: (len(tws), tws))
+        for tws in seeds:
+            if tws not in self.R:
+                self.addPath(tws)
+        return seeds
+
+    def knownReset(self, tws):
+        """Reset at the end of tws, as reported by the teacher (only used
+        in reset-observable mode).
+
+        """
+        return len(tws) > 0 and self.ota.runTimedWordReset(tws)[1][-1]
+
+    def lastReset(self, tws):
+        """Index of the last reset in tws reported by the teacher, or -1 if
+        there is no reset (only used in reset-observable mode).
+
+        """
+        resets = self.ota.runTimedWordReset(tws)[1]
+        for i in reversed(range(len(resets))):
+            if resets[i]:
+                return i
+        return -1
+
+    def generatePairs(self, t1, t2):
+        """Generate the possible pairs of last resets of t1 and t2 (see
+        generate_pair). In reset-observable mode, this is only the actual pair.
+
+        """
+        if self.reset_observable:
+            return ((self.lastReset(t1), self.lastReset(t2)),)
+        return generate_pair(t1, t2)
+
+    def generateResetBits(self, t1, t2):
+        """Generate the possible resets (TT, TF, FT or FF) at the end of t1
+        and t2. In reset-observable mode, this is only the actual one.
+
+        """
+        if self.reset_observable:
+            if self.knownReset(t1):
+                return (TT,) if self.knownReset(t2) else (TF,)
+            else:
+                return (FT,) if self.knownReset(t2) else (FF,)
+        return range(4)
+
     def checkNewState(self, tws):
         """Check if tw is different from any other rows in S."""
         if tws in self.S:
@@ -515,7 +736,7 @@ class Learner:
         for row in self.S:
             if row != tws:
                 # resets = generate_reset_rows(row, tws)
-                pairs = generate_pair(row, tws)
+                pairs = self.generatePairs(row, tws)
                 for i, j in pairs:
                 # for reset in resets:
                     reset = generate_reset_at_ij(row, tws, i, j)
@@ -590,15 +811,11 @@ class Learner:
         r_3: (a, t1, ⊥)(b, t2, ⊥)(c, t3, ⊤),
         r_4: (a, t1, ⊥)(b, t2, ⊥)(c, t3, ⊤)(d, t4, ⊤)
         since (a, t1) and (a, t1)(b, t2) 's reset cannot influence the whole time.
+
+        The formula is the conjunction of the literals of the assignment,
+        built once for each distinct assignment (see formula_factory).
         """
-        formula = []
-        for row, r in reset.items():
-            if r:
-                formula.append(resets_var[row])
-            else:
-                formula.append(z3.Not(resets_var[row]))
-        assert len(formula) > 0, "Invalid resets!"
-        return z3.And(formula)
+        return self.formulas.encodeReset(reset, resets_var)
 
     def differentStateUnderReset(self):
         """Constraint 1: if two rows can be distinguished under a reset, then they
@@ -607,6 +824,38 @@ class Learner:
         """
         return self.constraint1_formula
 
+    def addDistinct(self, tw1, tw2):
+        """Record that rows tw1 and tw2 are in different states under any
+        resets, and return the corresponding formula of constraint1.
+
+        """
+        self.distinct.setdefault(tw1, set()).add(tw2)
+        self.distinct.setdefault(tw2, set()).add(tw1)
+        return self.encoding.different(self.state_name[tw1], self.state_name[tw2])
+
+    def cliqueBound(self, starts=10):
+        """Return a lower bound on the number of locations: the size of a
+        clique of rows in different states, found greedily from each of the
+        starts rows of highest degree. Rows of S are fixed to different
+        states, so they are also adjacent to each other.
+
+        """
+        def adjacent(tw1, tw2):
+            return (tw1 in self.S and tw2 in self.S) or tw2 in self.distinct.get(tw1, ())
+
+        def degree(tw):
+            return len(self.distinct.get(tw, ())) + (len(self.S) if tw in self.S else 0)
+
+        rows = sorted(dict.fromkeys(list(self.S) + list(self.distinct)), key=degree, reverse=True)
+        bound = len(self.S)
+        for start in rows[:starts]:
+            clique = [start]
+            for row in rows:
+                if row != start and all(adjacent(row, r) for r in clique):
+                    clique.append(row)
+            bound = max(bound, len(clique))
+        return bound
+
     def noForbiddenPair(self):
         """Constraint 2: for any tow rows R1 + (a, t1) and R2 + (a, t2), 
         if states[R1] = states[R2], and they are in the same time interval,
@@ -624,47 +873,79 @@ class Learner:
         return self.constraint4_formula1 + self.constraint4_formula2
 
     def setSinkRowReset(self):
-        """Constraint 5: All sink rows's resets are set to True."""
-        formulas = []
-        for r, info in self.R.items():
-            if info.is_sink:
-                # if r not in self.sink_constraint:
-                #     self.sink_constraint.add(r)
-                formulas.append(self.reset_name[r] == True)
+        """Constraint 5: All sink rows's resets are set to True. Since sink
+        rows share r_sink, a single formula suffices.
 
-        return formulas
+        """
+        return [self.sink_reset_name == True]
 
     def encodeSRow(self):
-        """Each row in S should have a unique state."""
+        """Each row in S should have a unique state. Only the formulas for
+        rows added to S since the last call are returned.
+
+        """
         formulas = []
         for i, s in enumerate(self.S):
-            formulas.append(self.state_name[s] == (i + 1))
+            if i >= self.pinned_num:
+                formulas.append(self.encoding.hasValue(self.state_name[s], i + 1))
+        self.pinned_num = len(self.S)
 
         return formulas
 
-    def encodeStateNum(self, state_num):
-        """The state name of each row must be between 1 and state_num, except the
-        sink states, which must have state_num equal to state_num + 1.
-        
+    def encodeStateNum(self):
+        """The state name of each row must be between 1 and n, except the
+        sink states, which must be different from all of them. Only the
+        formulas created by the encoding since the last call are returned.
+
         """
-        formulas = []
-        for row, s in self.state_name.items():
-            if self.R[row].is_sink:
-                formulas.append(s == state_num + 1)
-            else:
-                formulas.append(s >= 1)
-                formulas.append(s <= state_num)
+        return self.encoding.newFormulas()
 
-        return formulas
+    def stateNumLiteral(self, state_num):
+        """Return the assumption literal setting n to state_num."""
+        lit = self.encoding.stateNumLiteral(state_num)
+        self.solver.add(*self.encoding.newFormulas())
+        return lit
+
+    def symmetryLiteral(self):
+        """Return the assumption literal breaking the symmetry between the
+        locations not fixed by S: rows outside S, in the order they were
+        added to R, use the smallest free location first.
+
+        """
+        states = [s for row, s in self.state_name.items()
+                  if row not in self.S and not self.R[row].is_sink]
+        lit = self.encoding.symmetryLiteral(len(self.S), states)
+        self.solver.add(*self.encoding.newFormulas())
+        return lit
 
     def encodeExtraS(self, state_num):
         """The states in extra_S must cover all remaining state_num."""
         formulas = []
         for i in range(len(self.S)+1, state_num+1):
-            formulas.append(z3.Or(*(self.state_name[row] == i for row in self.extra_S)))
+            if self.extra_S:
+                formulas.append(z3.Or(*(self.encoding.hasValue(self.state_name[row], i) for row in self.extra_S)))
+            else:
+                formulas.append(z3.BoolVal(False))
 
         return formulas
 
+    def extraSLiteral(self, state_num):
+        """Return the assumption literal enforcing encodeExtraS(state_num)
+        for the current S and extra_S.
+
+        """
+        key = (state_num, len(self.S), len(self.extra_S))
+        if key not in self.extra_S_literal:
+            lit = z3.Bool("extra_%d_%d_%d" % key)
+            # Empty conjunctions and disjunctions are avoided, since they
+            # cannot be written in SMT-LIB (for checkpoints and portfolio).
+            formulas = self.encodeExtraS(state_num)
+            if formulas:
+                self.solver.add(z3.Implies(lit, z3.And(*formulas)))
+            self.solver.add(*self.encoding.newFormulas())
+            self.extra_S_literal[key] = lit
+        return self.extra_S_literal[key]
+
     def clearConstraint(self):
         self.constraint1_formula_num += len(self.constraint1_formula)
         self.full_constraint1 += self.constraint1_formula
@@ -698,6 +979,101 @@ class Learner:
             print()
         
 
+    def exportQuery(self, assumptions):
+        """Return the current query as an SMT-LIB string, in which the
+        assumptions are asserted.
+
+        """
+        export = z3.Solver()
+        export.add(self.solver.assertions())
+        export.add(*assumptions)
+        return export.sexpr()
+
+    def dumpQuery(self, assumptions, state_num, enforce_extra, res, solve_time):
+        """Write the current query to a standalone SMT-LIB file in dump_dir.
+        The metadata are written as comments at the top of the file, and
+        appended as a JSON line to dump_dir/index.jsonl.
+
+        """
+        os.makedirs(self.dump_dir, exist_ok=True)
+        file_name = "%s_%05d.smt2" % (self.ota.name, self.dump_num)
+        self.dump_num += 1
+        meta = {
+            "file": file_name,
+            "model": self.ota.name,
+            "step": self.step,
+            "state_num": state_num,
+            "enforce_extra": enforce_extra,
+            "encoding": self.encoding_name,
+            "rows": len(self.R),
+            "S": len(self.S),
+            "extra_S": len(self.extra_S),
+            "E": len(self.E),
+            "constraint1": self.constraint1_formula_num,
+            "constraint2": self.constraint2_formula_num,
+            "constraint4": self.constraint4_formula_num,
+            "assertions": len(self.solver.assertions()),
+            "result": str(res),
+            "time": solve_time,
+        }
+        with open(os.path.join(self.dump_dir, file_name), "w") as f:
+            for key, value in meta.items():
+                f.write("; %s: %s\n" % (key, value))
+            f.write(self.exportQuery(assumptions))
+            f.write("(check-sat)\n")
+        with open(os.path.join(self.dump_dir, "index.jsonl"), "a") as f:
+            f.write(json.dumps(meta) + "\n")
+
+    def check(self, assumptions):
+        """Check the solver under the given assumptions. Return a tuple
+        (res, model), where model is None unless res is sat. If res is
+        unsat, the unsat core (if known) is stored in unsat_core.
+
+        With a portfolio, the incremental solver gives up after
+        portfolio_delay seconds. The problem is then exported and solved
+        by each configuration of the portfolio in parallel.
+
+        """
+        self.unsat_core = None
+        if self.portfolio is not None:
+            if self.portfolio_delay > 0:
+                self.solver.set("timeout", int(self.portfolio_delay * 1000))
+                res = self.solver.check(*assumptions)
+                self.solver.set("timeout", 4294967295)
+                if res == z3.sat:
+                    return res, self.solver.model()
+                elif res == z3.unsat:
+                    self.unsat_core = self.solver.unsat_core()
+                    return res, None
+
+            text = self.exportQuery(assumptions)
+            res, values, config = solve_portfolio(text, self.portfolio)
+            print("Portfolio: %s by %s" % (res, config))
+            if res == "sat":
+                return z3.sat, PortfolioModel(values)
+            elif res == "unsat":
+                return z3.unsat, None
+
+        res = self.solver.check(*assumptions)
+        if res == z3.unsat:
+            self.unsat_core = self.solver.unsat_core()
+        return res, self.solver.model() if res == z3.sat else None
+
+    def setInitialValues(self, resets, states):
+        """Give the resets and states found by findReset to the solver as
+        initial values for the next call. Consecutive calls differ by a few
+        rows and constraints, so the next model is usually close.
+
+        """
+        for row in self.R:
+            if self.R[row].is_sink:
+                continue
+            r = self.reset_name[row]
+            if not (z3.is_true(r) or z3.is_false(r)):
+                self.solver.set_initial_value(r, z3.BoolVal(resets[row]))
+            for var, val in self.encoding.initialValues(self.state_name[row], int(states[row])):
+                self.solver.set_initial_value(var, val)
+
     def findReset(self, state_num, enforce_extra):
         """Find a valid setting of resets and states.
         
@@ -707,44 +1083,96 @@ class Learner:
             
         Return a tuple (resets, states). 
 
+        Statistics of the call are stored in call_stats, a dictionary with:
+        step, state_num, enforce_extra and result ("sat", "unsat" or
+        "unknown"); table_time, the time since the previous call returned
+        (membership queries and table updates); build_time, check_time and
+        model_time, the time to build and add the formulas, to solve, and
+        to read the resets and states from the model; new_assertions,
+        assertions, assumptions and scopes, the numbers of formulas added
+        in this call, of formulas in the solver, of assumption literals and
+        of solver scopes; and z3, the statistics reported by the solver.
+
         """
+        assert state_num >= len(self.S)
+        start_time = time.perf_counter()
+        num_assertions = len(self.solver.assertions())
         constraint1 = self.differentStateUnderReset()
         constraint2 = self.noForbiddenPair()
         constraint4 = self.checkConsistency()
-        constraint5 = self.setSinkRowReset()
+        constraint6 = self.encodeStateNum()
         constraint7 = self.encodeSRow()
 
-        assert state_num >= len(self.S)
-        constraint6 = self.encodeStateNum(state_num)
-        if enforce_extra:
-            constraint8 = self.encodeExtraS(state_num)
-        else:
-            constraint8 = []
-
+        # New constraints are added once to the base scope of the solver.
+        # They stay valid when state_num or S change, so that the solver
+        # keeps what it learned between calls.
+        self.solver.add(*self.formulas.newFormulas(
+            constraint1 + constraint2 + constraint4 + constraint6 + constraint7))
+        self.clearConstraint()
         print("%d %d %d\n" % (self.constraint1_formula_num,
                     self.constraint2_formula_num, self.constraint4_formula_num))
-        self.solver.push()
-        self.solver.add(*(constraint1 + constraint2 + constraint4 + constraint5))
-        self.solver.push()
-        self.solver.add(*(constraint6 + constraint7 + constraint8))
-        
-        if str(self.solver.check()) == "unsat":
+
+        # Each group of constraints depending on state_num, S or extra_S is
+        # enabled by a named assumption, so that the unsat core tells which
+        # groups are in conflict.
+        assumptions = [self.stateNumLiteral(state_num)]
+        extra_lit = None
+        if enforce_extra:
+            extra_lit = self.extraSLiteral(state_num)
+            assumptions.append(extra_lit)
+        if self.symmetry_breaking:
+            assumptions.append(self.symmetryLiteral())
+
+        check_start = time.perf_counter()
+        res, model = self.check(assumptions)
+        check_end = time.perf_counter()
+        if self.dump_dir is not None:
+            self.dumpQuery(assumptions, state_num, enforce_extra, res, check_end - check_start)
+        z3_stats = self.solver.statistics()
+        z3_stats = dict((k, z3_stats.get_key_value(k)) for k in z3_stats.keys())
+        self.call_stats = {
+            "step": self.step,
+            "state_num": state_num,
+            "enforce_extra": enforce_extra,
+            "result": str(res),
+            "table_time": start_time - self.last_call_end,
+            "build_time": check_start - start_time,
+            "check_time": check_end - check_start,
+            "model_time": 0.0,
+            "new_assertions": len(self.solver.assertions()) - num_assertions,
+            "assertions": len(self.solver.assertions()),
+            "assumptions": len(assumptions),
+            "scopes": self.solver.num_scopes(),
+            "z3": z3_stats,
+        }
+        self.last_call_end = check_end
+        if res == z3.unsat:
             # No assignment can be found for current S, extra_S, and state_num
-            self.solver.pop()
+            if self.unsat_core is None:
+                self.extra_S_in_core = extra_lit is not None
+            else:
+                self.core_sizes.append(len(self.unsat_core))
+                self.extra_S_in_core = extra_lit is not None and any(lit.eq(extra_lit) for lit in self.unsat_core)
+                print("Unsat core: %s" % ", ".join(str(lit) for lit in self.unsat_core))
             return None, None
 
         # An assignment is found, construct resets and states from the model.
-        model = self.solver.model()
-        self.solver.pop()
-        self.clearConstraint()
         resets, states = dict(), dict()
 
         for row in self.R:
-            states[row] = str(model[self.state_name[row]])
-            resets[row] = bool(model[self.reset_name[row]])
+            if self.R[row].is_sink:
+                states[row] = str(state_num + 1)
+            else:
+                states[row] = str(self.encoding.value(model, self.state_name[row]))
+            resets[row] = z3.is_true(model.eval(self.reset_name[row], model_completion=True))
 
         states["sink"] = str(state_num + 1)
 
+        if self.phase_hints:
+            self.setInitialValues(resets, states)
+
+        self.last_call_end = time.perf_counter()
+        self.call_stats["model_time"] = self.last_call_end - check_end
         return resets, states
 
 
@@ -803,8 +1231,9 @@ class Learner:
             for action, trans in transitions[source].items():
                 # Sort and remove duplicates
                 trans = sorted((time, reset, target) for time, (reset, target) in trans.items())
-                # If the first transition is not zero, add transition to sink
-                if trans[0][0] != 0:
+                # If there is no transition at zero (possibly no transition at
+                # all, when rows are deferred), add transition to sink
+                if not trans or trans[0][0] != 0:
                     trans = [(0, True, states["sink"])] + trans
 
                 trans_new = [trans[0]]
@@ -862,22 +1291,234 @@ def compute_max_time(candidate):
                     parse_time(tran.constraint.max_value))
     return max_time
 
-def learn_ota(ota, verbose=True, graph=False):
+def is_hypothesis_sink(hypothesis, loc):
+    return loc.sink or loc.name == hypothesis.sink_name
+
+def hypothesis_words(hypothesis):
+    """Compute the access sequences and transition words of a hypothesis.
+
+    Pairs of location and clock value are explored breadth-first, following
+    each transition at the earliest time allowed by its guard. Transitions
+    to the sink are covered (they fix the boundaries of the guards), but
+    not explored further.
+
+    Return a tuple (access, trans_words), where access maps the name of
+    each reachable location to a timed word reaching it, and trans_words
+    is the list of timed words taking each enabled transition from each
+    explored pair.
+
+    """
+    sinks = set(loc.name for loc in hypothesis.locations if is_hypothesis_sink(hypothesis, loc))
+    init = (hypothesis.init_state, Decimal(0))
+    access = {hypothesis.init_state: ()}
+    words = {init: ()}
+    trans_words = []
+    to_explore = [init]
+    while to_explore:
+        loc, v = to_explore.pop(0)
+        for idx, tran in enumerate(hypothesis.trans):
+            if tran.source != loc:
+                continue
+
+            # Earliest clock value no less than v satisfying the guard.
+            min_value = Decimal(tran.constraint.min_value)
+            points = [t for t in (v, min_value, min_value + Decimal("0.5"))
+                      if t >= v and tran.constraint.contains_point(t)]
+            if not points:
+                continue
+            t = min(points)
+
+            tws = words[(loc, v)] + (TimedWord(tran.action, t - v),)
+            trans_words.append(tws)
+            if tran.target in sinks:
+                continue
+            if tran.target not in access:
+                access[tran.target] = tws
+            target = (tran.target, Decimal(0) if tran.reset else t)
+            if target not in words:
+                words[target] = tws
+                to_explore.append(target)
+
+    return access, trans_words
+
+def hypothesis_suffixes(hypothesis, access):
+    """Compute suffixes distinguishing the reachable locations of a hypothesis.
+
+    For each pair of locations with the same acceptance, the suffix is the
+    counterexample of the equivalence query between two copies of the
+    hypothesis starting from the two locations.
+
+    """
+    locs = sorted(access)
+    max_time = compute_max_time(hypothesis)
+    copies = dict()
+    for loc in locs:
+        copies[loc] = buildAssistantOTA(OTA(hypothesis.name, hypothesis.sigma, hypothesis.locations,
+                                            hypothesis.trans, loc, hypothesis.accept_states))
+
+    suffixes = []
+    for i, loc1 in enumerate(locs):
+        for loc2 in locs[i+1:]:
+            if (loc1 in hypothesis.accept_states) != (loc2 in hypothesis.accept_states):
+                continue
+            res, suffix = OTAEquivalence(max_time, copies[loc1], copies[loc2]).test_equivalent()
+            if not res and suffix not in suffixes:
+                suffixes.append(suffix)
+    return suffixes
+
+def replay_queries(ota, candidate, table, known=()):
+    """Return the first timed word answered by a membership query of ota,
+    and not in known, on which candidate differs from ota in whether the
+    word is accepted. table is the transition table of candidate. Return
+    None if there is no such word.
+
+    """
+    init_accept = candidate.init_state in candidate.accept_states
+    for tws, res in ota.query.items():
+        if tws in known:
+            continue
+        if tws:
+            tran = table.run(tws)
+            accept = tran is not None and tran[2]
+        else:
+            accept = init_accept
+        if (res == 1) != accept:
+            return tws
+    return None
+
+def search_state_num(learner, state_num, stats_callback=None):
+    """Return the smallest number of locations n > state_num such that
+    findReset(n, False) is sat, given that it is unsat for state_num.
+
+    The increment over state_num is doubled until a sat call, then the
+    smallest n is found by binary search. Rows and constraints are only
+    added, so n is the value reached by incrementing state_num one at a
+    time, in a logarithmic number of calls.
+
+    """
+    def is_sat(n):
+        resets, _ = learner.findReset(n, False)
+        if stats_callback is not None:
+            stats_callback(learner.call_stats)
+        return resets is not None
+
+    lo, step = state_num, 1
+    while not is_sat(lo + step):
+        lo += step
+        step *= 2
+    hi = lo + step
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if is_sat(mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+def learn_ota(ota, verbose=True, graph=False, checkpoint=None, checkpoint_interval=60, resume=False,
+              hypothesis=None, reset_observable=False, lazy_successors=False,
+              encoding="int", symmetry_breaking=False, portfolio=None, portfolio_delay=1.0,
+              dump_dir=None, stats_callback=None, phase_hints=False,
+              state_num_search="linear", replay=False, eq_stats_callback=None, num_ctx=1,
+              incremental=False, equivalence="region"):
     """Overall learning loop.
     
     verbose - whether to print debug information.
+    checkpoint - path of the checkpoint file, written after a failed
+        equivalence query.
+    checkpoint_interval - minimum number of seconds between two writes
+        of the checkpoint file.
+    resume - whether to continue from the checkpoint file, if it exists.
+        The options of the learning loop (state_num_search, replay, num_ctx,
+        incremental, equivalence) are then restored from the checkpoint,
+        and the options of the Learner are those of the saved Learner.
+    hypothesis - a previously learned OTA, used to seed the table.
+    reset_observable - whether the teacher reports clock resets with each
+        membership query, so that resets need not be guessed.
+    lazy_successors - whether successor rows going immediately to the sink
+        are only added when needed.
+    encoding - encoding of the states in the SMT problem: "int", "bv" or
+        "onehot" (see state_encoding).
+    symmetry_breaking - whether to break the symmetry between locations
+        not fixed by S.
+    portfolio - list of solver configurations (see portfolio.CONFIGS) run
+        in parallel when solving takes more than portfolio_delay seconds.
+    dump_dir - directory where each query of findReset is written as an
+        SMT-LIB file, with its metadata (see Learner.dumpQuery).
+    stats_callback - function called with the statistics of each call to
+        findReset (see Learner.findReset).
+    phase_hints - whether each call to findReset starts from the resets and
+        states found by the previous call.
+    state_num_search - how state_num is increased when no assignment
+        exists: "linear" (by one) or "galloping" (see search_state_num).
+    replay - whether the answers to previous membership queries are
+        checked against the candidate before the equivalence test (see
+        replay_queries). A mismatch is used as counterexample, and the
+        equivalence test is skipped.
+    eq_stats_callback - function called with the statistics of each
+        equivalence query, a dictionary with: step, replayed (whether the
+        counterexample was found by replay), replay_time, check_time
+        (the time of the equivalence test, 0 if skipped) and num_ctx (the
+        number of counterexamples).
+    num_ctx - maximum number of counterexamples returned by each
+        equivalence query (see OTAEquivalence.find_counterexamples). All of
+        them are added to the table before the next call to findReset.
+    incremental - whether each equivalence query reuses the part of the
+        product explored by the previous one that does not depend on
+        changed transitions of the candidate (see IncrementalEquivalence).
+        Requires the region equivalence test.
+    equivalence - the equivalence test: "region" (see OTAEquivalence) or
+        "symbolic" (see SymbolicEquivalence), whose cost does not grow with
+        the largest constant.
 
     """
     print("Start to learn ota %s.\n" % ota.name)
-    learner = Learner(ota)
     assist_ota = buildAssistantOTA(ota)
     max_time_ota = compute_max_time(ota)
-    state_num = 1
-    eq_query_num = 0
-    step = 0
+    # Options of the learning loop, saved with each checkpoint (the options
+    # of the Learner are saved with it).
+    options = dict(state_num_search=state_num_search, replay=replay, num_ctx=num_ctx,
+                   incremental=incremental, equivalence=equivalence)
+    last_checkpoint = time.perf_counter()
+    if resume and checkpoint is not None and os.path.exists(checkpoint):
+        learner, loop_state = load_checkpoint(checkpoint, ota)
+        options = restore_options(loop_state, options)
+        state_num_search = options["state_num_search"]
+        replay = options["replay"]
+        num_ctx = options["num_ctx"]
+        incremental = options["incremental"]
+        equivalence = options["equivalence"]
+        learner.last_call_end = time.perf_counter()
+        state_num = loop_state["state_num"]
+        eq_query_num = loop_state["eq_query_num"]
+        step = loop_state["step"]
+        print("Resume from %s after step %d.\n" % (checkpoint, step))
+    else:
+        learner = Learner(ota, reset_observable, lazy_successors, encoding, symmetry_breaking,
+                          portfolio, portfolio_delay, dump_dir, phase_hints)
+        state_num = 1
+        eq_query_num = 0
+        step = 0
+        if hypothesis is not None:
+            seeds = learner.addHypothesis(hypothesis)
+            changed = [tws for tws in seeds if hypothesis.runTimedWord(tws) != ota.runTimedWord(tws)]
+            print("Seeded %d rows and %d suffixes from hypothesis, %d rows changed.\n" % (
+                len(seeds), len(learner.E), len(changed)))
+    assert equivalence in ("region", "symbolic"), "Unknown equivalence test %s." % equivalence
+    assert not incremental or equivalence == "region", "Incremental test requires region equivalence."
+    equivalence_class = OTAEquivalence if equivalence == "region" else SymbolicEquivalence
+    # Transitions of the teacher, shared by all equivalence queries. The
+    # size of the tables grows with the largest constant, so they are only
+    # built when used.
+    assist_table = TransitionTable(assist_ota) if equivalence == "region" else None
+    incremental_equiv = IncrementalEquivalence(assist_ota, assist_table, OTAEquivalence) if incremental else None
+    # Number of consecutive calls without assignment, since the table
+    # does not change between them.
+    failures = 0
     while True:
         step += 1
         print("Step", step)
+        learner.step = step
 
         # If size of S has increased beyond state_num, adjust state_num to
         # that size.
@@ -885,6 +1526,13 @@ def learn_ota(ota, verbose=True, graph=False):
             state_num = len(learner.S)
             print("Adjust state_num to len(S) = %s" % state_num)
 
+        # Calls with fewer locations than a clique of rows in different
+        # states are unsat, so skip them.
+        bound = learner.cliqueBound()
+        if state_num < bound:
+            state_num = bound
+            print("Adjust state_num to clique bound = %s" % state_num)
+
         print("#S = %d, #extra_S = %d, state_num = %d, #R = %d, #R (no sink) = %d" % (
             len(learner.S), len(learner.extra_S), state_num, len(learner.R),
             len([row for row, s in learner.R.items() if not s.is_sink])
@@ -893,19 +1541,35 @@ def learn_ota(ota, verbose=True, graph=False):
         # First, try with current state_num and enforce the constraint
         # that all representatives are in extra_S.
         resets, states = learner.findReset(state_num, True)
+        if stats_callback is not None:
+            stats_callback(learner.call_stats)
 
         # If fails, try again without the constraint that all representatives
-        # are in extra_S. Add any new representative to extra_S.
+        # are in extra_S. Add any new representative to extra_S. If the
+        # unsat core does not contain that constraint, the call without it
+        # is also unsat, so skip it.
         if resets is None:
-            resets, states = learner.findReset(state_num, False)
+            if learner.extra_S_in_core:
+                resets, states = learner.findReset(state_num, False)
+                if stats_callback is not None:
+                    stats_callback(learner.call_stats)
+            else:
+                print("Skip the call without extra_S (not in unsat core).")
 
             # If still not found, must increase state_num.
+            # After the first increment, the search may skip several values
+            # at once.
             if resets is None:
-                state_num += 1
+                failures += 1
+                if state_num_search == "galloping" and failures > 1:
+                    state_num = search_state_num(learner, state_num, stats_callback)
+                else:
+                    state_num += 1
                 print("Increment state_num to %s." % state_num)
                 continue
 
             # Otherwise, add new representatives to extra_S.
+            failures = 0
             has_reps = dict()
             for i in range(1, state_num+1):
                 has_reps[i] = False
@@ -926,6 +1590,8 @@ def learn_ota(ota, verbose=True, graph=False):
                 learner.addPossibleS(rep)
             continue
 
+        failures = 0
+
         if verbose:
             print(learner)
 
@@ -938,6 +1604,11 @@ def learn_ota(ota, verbose=True, graph=False):
             for tws, v in resets.items():
                 print("  %s: %s %s" % (",".join(str(tw) for tw in tws), v, states[tws]))
 
+        # Add deferred successor rows that the candidate would contradict,
+        # and search again.
+        if learner.pending and learner.materializePending(resets, states):
+            continue
+
         f, candidate = learner.buildCandidateOTA(resets, states)
         if not f:
             raise AssertionError("buildCandidateOTA failed.")
@@ -945,11 +1616,36 @@ def learn_ota(ota, verbose=True, graph=False):
         max_time_candidate = compute_max_time(candidate)
         max_time = max(max_time_ota, max_time_candidate)
 
-        ota_equiv = OTAEquivalence(max_time, assist_ota, candidate)
-        res, ctx_path = ota_equiv.test_equivalent()
+        # Words in R are not replayed: the candidate agrees with them by
+        # construction, and they would add no information to the table.
+        replay_start = time.perf_counter()
+        candidate_table = TransitionTable(candidate) if replay or equivalence == "region" else None
+        ctx_path = replay_queries(ota, candidate, candidate_table, learner.R) if replay else None
+        check_start = time.perf_counter()
+        replayed = ctx_path is not None
+        if replayed:
+            ctx_paths = [ctx_path]
+        else:
+            if incremental:
+                ota_equiv = incremental_equiv.equivalence_test(max_time, candidate, candidate_table)
+            else:
+                ota_equiv = equivalence_class(max_time, assist_ota, candidate,
+                                              table_A=assist_table, table_B=candidate_table)
+            ctx_paths = ota_equiv.find_counterexamples(num_ctx)
+        res = not ctx_paths
+        if eq_stats_callback is not None:
+            eq_stats_callback({
+                "step": step,
+                "replayed": replayed,
+                "replay_time": check_start - replay_start,
+                "check_time": 0.0 if replayed else time.perf_counter() - check_start,
+                "num_ctx": len(ctx_paths),
+            })
 
         # res, ctx = ota_equivalent(max_time, assist_ota, candidate)
-        eq_query_num += 1
+        # No equivalence query is made when replay found a counterexample.
+        if not replayed:
+            eq_query_num += 1
         if not res and verbose:
             print(candidate)
         if res:
@@ -958,6 +1654,27 @@ def learn_ota(ota, verbose=True, graph=False):
             return candidate, len(ota.query), eq_query_num
         if graph:
             OTAToDOT(candidate, "Step %d" % step)
-        if verbose:
-            print("Counterexample", ctx_path, ota.runTimedWord(ctx_path), candidate.runTimedWord(ctx_path))
-        learner.addPath(ctx_path)
+        for ctx_path in ctx_paths:
+            # Rows added for an earlier counterexample may already contain
+            # a later one.
+            if ctx_path in learner.R:
+                continue
+            if verbose:
+                print("Counterexample", ctx_path, ota.runTimedWord(ctx_path), candidate.runTimedWord(ctx_path))
+            learner.addPath(ctx_path)
+        if checkpoint is not None and time.perf_counter() - last_checkpoint >= checkpoint_interval:
+            save_checkpoint(checkpoint, ota, learner, state_num=state_num,
+                            step=step, eq_query_num=eq_query_num, options=options)
+            last_checkpoint = time.perf_counter()
+
+def resume_ota(ota, checkpoint, verbose=True, graph=False, checkpoint_interval=60, **options):
+    """Continue learning ota from the given checkpoint file. Learning
+    starts from scratch if the file does not exist yet.
+
+    options - other options of learn_ota. When the checkpoint exists, the
+        options of the learning loop and of the Learner are taken from it
+        (see learn_ota), and only the callbacks given here are used.
+
+    """
+    return learn_ota(ota, verbose=verbose, graph=graph, checkpoint=checkpoint,
+                     checkpoint_interval=checkpoint_interval, resume=True, **options)
@@ -0,0 +1,327 @@
+"""Encodings of the state assigned to each row in the SMT problem
+solved by findReset.
+
+A state is an opaque object created by newState. The learner builds
+formulas over states only through the methods same, different and
+hasValue, and reads the assigned states with value. Any formulas an
+encoding needs for itself (bounds, auxiliary definitions) are collected
+and returned by newFormulas, which the learner adds to the base scope of
+its solver.
+
+The number of locations n is not fixed when the formulas are built: it is
+chosen in each call to findReset by the literal from stateNumLiteral,
+passed to the solver as an assumption. States of non-sink rows range over
+1..n, the sink state is different from all of them.
+
+Three encodings are available:
+
+- "int": each state is an integer variable.
+- "bv": each state is a bit-vector variable of width BV_WIDTH, which the
+  solver bit-blasts into a SAT problem.
+- "onehot": each state is a set of Boolean variables b_k, one for each
+  possible location k, of which exactly one is true.
+
+"""
+
+import z3
+
+# Width of the bit-vectors used by the "bv" encoding.
+BV_WIDTH = 16
+
+
+class IntEncoding:
+    """Each state is an integer variable, ranging over 1..n. The sink state
+    is the integer n + 1.
+
+    """
+    def __init__(self):
+        self.state_num_name = z3.Int("n")
+        self.sink = z3.Int("s_sink")
+
+        # Assumption literal fixing n to each value tried so far.
+        self.state_num_literal = dict()
+
+        # Chains of symmetry breaking, indexed by the number of fixed states.
+        self.chains = dict()
+
+        # States created since the last call to newFormulas.
+        self.new_states = []
+        self.pending = [self.sink == self.state_num_name + 1]
+
+    def const(self, i):
+        return i
+
+    def le(self, x, y):
+        return x <= y
+
+    def gt(self, x, y):
+        return x > y
+
+    def newState(self, name):
+        s = z3.Int(name)
+        self.new_states.append(s)
+        return s
+
+    def same(self, x, y):
+        return x == y
+
+    def different(self, x, y):
+        return x != y
+
+    def hasValue(self, x, i):
+        return x == self.const(i)
+
+    def value(self, model, x):
+        return model.eval(x, model_completion=True).as_long()
+
+    def initialValues(self, x, i):
+        """Return the pairs (variable, value) giving state x the value i,
+        used as initial values for the solver.
+
+        """
+        return [(x, z3.IntVal(i))]
+
+    def newFormulas(self):
+        """Return the formulas created since the last call: the bounds of
+        new states, and the definitions of new literals.
+
+        """
+        formulas = self.pending
+        for s in self.new_states:
+            formulas.append(self.le(self.const(1), s))
+            formulas.append(self.le(s, self.state_num_name))
+        self.new_states = []
+        self.pending = []
+        return formulas
+
+    def stateNumLiteral(self, state_num):
+        """Return the assumption literal setting n to state_num."""
+        if state_num not in self.state_num_literal:
+            lit = z3.Bool("n_%d" % state_num)
+            self.pending.append(z3.Implies(lit, self.state_num_name == self.const(state_num)))
+            self.state_num_literal[state_num] = lit
+        return self.state_num_literal[state_num]
+
+    def symmetryLiteral(self, fixed_num, states):
+        """Return an assumption literal breaking the symmetry between the
+        locations fixed_num + 1, ..., n.
+
+        states - states not fixed to one of 1..fixed_num. Each call must
+            pass the states of the previous call (for the same fixed_num)
+            as a prefix.
+
+        The i-th state may only use a location at most one larger than the
+        locations used by the first i - 1 states (and fixed_num).
+
+        """
+        if fixed_num not in self.chains:
+            self.chains[fixed_num] = (z3.Bool("sym_%d" % fixed_num), [self.const(fixed_num)])
+        lit, maxs = self.chains[fixed_num]
+        for i in range(len(maxs) - 1, len(states)):
+            s, m = states[i], maxs[-1]
+            m2 = self.newMax(fixed_num, i)
+            self.pending.append(z3.Implies(lit, z3.And(
+                self.le(s, m + self.const(1)), m2 == z3.If(self.gt(s, m), s, m))))
+            maxs.append(m2)
+        return lit
+
+    def newMax(self, fixed_num, i):
+        return z3.Int("m_%d_%d" % (fixed_num, i))
+
+
+class BitVecEncoding(IntEncoding):
+    """Each state is a bit-vector variable, ranging over 1..n. The sink
+    state is n + 1.
+
+    """
+    def __init__(self):
+        self.state_num_name = z3.BitVec("n", BV_WIDTH)
+        self.sink = z3.BitVec("s_sink", BV_WIDTH)
+        self.state_num_literal = dict()
+        self.chains = dict()
+        self.new_states = []
+        self.pending = [self.sink == self.state_num_name + 1]
+
+    def const(self, i):
+        return z3.BitVecVal(i, BV_WIDTH)
+
+    def le(self, x, y):
+        return z3.ULE(x, y)
+
+    def gt(self, x, y):
+        return z3.UGT(x, y)
+
+    def newState(self, name):
+        s = z3.BitVec(name, BV_WIDTH)
+        self.new_states.append(s)
+        return s
+
+    def initialValues(self, x, i):
+        return [(x, self.const(i))]
+
+    def newMax(self, fixed_num, i):
+        return z3.BitVec("m_%d_%d" % (fixed_num, i), BV_WIDTH)
+
+
+class OneHotEncoding:
+    """Each state is an index into self.bits, the Boolean variables b_1,
+    ..., b_K of the state. The state has location k if b_k is true. K is
+    the largest state number requested so far. The sink state is None.
+
+    Equality between two states x and y is represented by an auxiliary
+    variable e_x_y, defined by clauses for each location k.
+
+    """
+    def __init__(self):
+        self.sink = None
+        self.bits = []
+        self.state_num = 0
+
+        # Assumption literal for each state number, requiring each state to
+        # have one of the locations 1..state_num.
+        self.state_num_literal = dict()
+
+        # Auxiliary variable for the equality of each pair of states.
+        self.equal = dict()
+
+        # Chains of symmetry breaking, indexed by the number of fixed
+        # states. Each chain is a tuple (lit, states, used), where used[i]
+        # maps location k to a variable meaning that one of the first i + 1
+        # states has location k.
+        self.chains = dict()
+
+        self.pending = []
+
+    def bit(self, x, k):
+        """Return the variable for state x having location k."""
+        bits = self.bits[x]
+        while len(bits) < k:
+            bits.append(z3.Bool("%s_%d" % (bits.name, len(bits) + 1)))
+        return bits[k - 1]
+
+    def newState(self, name):
+        self.bits.append(_Bits(name))
+        x = len(self.bits) - 1
+        for k in range(1, self.state_num + 1):
+            self.pending.extend(self.atMostOne(x, k))
+        for state_num, lit in self.state_num_literal.items():
+            self.pending.append(self.atLeastOne(lit, x, state_num))
+        return x
+
+    def atMostOne(self, x, k):
+        """Clauses saying that x cannot have both location k and a smaller one."""
+        return [z3.Or(z3.Not(self.bit(x, l)), z3.Not(self.bit(x, k))) for l in range(1, k)]
+
+    def atLeastOne(self, lit, x, state_num):
+        return z3.Implies(lit, z3.Or(*(self.bit(x, k) for k in range(1, state_num + 1))))
+
+    def sameAt(self, e, x, y, k):
+        """Clauses defining e == (x == y) at location k."""
+        bx, by = self.bit(x, k), self.bit(y, k)
+        return [z3.Implies(z3.And(bx, by), e),
+                z3.Implies(z3.And(e, bx), by),
+                z3.Implies(z3.And(e, by), bx)]
+
+    def same(self, x, y):
+        if x is None or y is None:
+            return z3.BoolVal(x is y)
+        if x == y:
+            return z3.BoolVal(True)
+        key = (min(x, y), max(x, y))
+        if key not in self.equal:
+            e = z3.Bool("e_%d_%d" % key)
+            for k in range(1, self.state_num + 1):
+                self.pending.extend(self.sameAt(e, key[0], key[1], k))
+            self.equal[key] = e
+        return self.equal[key]
+
+    def different(self, x, y):
+        return z3.Not(self.same(x, y))
+
+    def hasValue(self, x, i):
+        return self.bit(x, i)
+
+    def value(self, model, x):
+        for k, b in enumerate(self.bits[x]):
+            if z3.is_true(model.eval(b, model_completion=True)):
+                return k + 1
+        assert False, "value: no location is assigned."
+
+    def initialValues(self, x, i):
+        return [(b, z3.BoolVal(k + 1 == i)) for k, b in enumerate(self.bits[x])]
+
+    def newFormulas(self):
+        formulas = self.pending
+        self.pending = []
+        return formulas
+
+    def extend(self, state_num):
+        """Add the clauses for locations up to state_num."""
+        for k in range(self.state_num + 1, state_num + 1):
+            for x in range(len(self.bits)):
+                self.pending.extend(self.atMostOne(x, k))
+            for (x, y), e in self.equal.items():
+                self.pending.extend(self.sameAt(e, x, y, k))
+            for fixed_num, (lit, states, used) in self.chains.items():
+                for i in range(len(states)):
+                    self.pending.extend(self.chainAt(lit, fixed_num, states, used, i, k))
+        self.state_num = max(self.state_num, state_num)
+
+    def stateNumLiteral(self, state_num):
+        """Return the assumption literal requiring each state to have one of
+        the locations 1..state_num.
+
+        """
+        self.extend(state_num)
+        if state_num not in self.state_num_literal:
+            lit = z3.Bool("n_%d" % state_num)
+            for x in range(len(self.bits)):
+                self.pending.append(self.atLeastOne(lit, x, state_num))
+            self.state_num_literal[state_num] = lit
+        return self.state_num_literal[state_num]
+
+    def chainAt(self, lit, fixed_num, states, used, i, k):
+        """Clauses of the symmetry breaking chain for the i-th state and
+        location k.
+
+        """
+        if k <= fixed_num:
+            return []
+        b = self.bit(states[i], k)
+        used[i][k] = z3.Bool("u_%d_%d_%d" % (fixed_num, i, k))
+        prev = used[i - 1].get(k, z3.BoolVal(False)) if i > 0 else z3.BoolVal(False)
+        formulas = [z3.Implies(lit, z3.Implies(used[i][k], z3.Or(prev, b)))]
+        if k > fixed_num + 1:
+            prev_used = used[i - 1].get(k - 1, z3.BoolVal(False)) if i > 0 else z3.BoolVal(False)
+            formulas.append(z3.Implies(lit, z3.Implies(b, prev_used)))
+        return formulas
+
+    def symmetryLiteral(self, fixed_num, states):
+        """See IntEncoding.symmetryLiteral. Location k > fixed_num + 1 may be
+        used by the i-th state only if location k - 1 is used by one of the
+        first i - 1 states.
+
+        """
+        if fixed_num not in self.chains:
+            self.chains[fixed_num] = (z3.Bool("sym_%d" % fixed_num), [], [])
+        lit, chain_states, used = self.chains[fixed_num]
+        for i in range(len(chain_states), len(states)):
+            chain_states.append(states[i])
+            used.append(dict())
+            for k in range(1, self.state_num + 1):
+                self.pending.extend(self.chainAt(lit, fixed_num, chain_states, used, i, k))
+        return lit
+
+
+class _Bits(list):
+    """Boolean variables of a state in the one-hot encoding."""
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+
+STATE_ENCODINGS = {
+    "int": IntEncoding,
+    "bv": BitVecEncoding,
+    "onehot": OneHotEncoding,
+}
@@ -10,9 +10,35 @@ from smart_learner import learn_ota
 
 from ocmm_smart_learner import learn_ocmm
 
-def smt_learn_dota(folder_name, file_name):
-    """Test the folder/file.json and write statistics into ./results/folder.txt"""
-    with open("./result/%s.txt" % folder_name, "a") as output_file:
+# Configurations of the state encoding compared by the "encoding" mode,
+# as (name, options of learn_ota).
+ENCODING_CONFIGS = [
+    ("int", {"encoding": "int"}),
+    ("int-sym", {"encoding": "int", "symmetry_breaking": True}),
+    ("bv", {"encoding": "bv"}),
+    ("bv-sym", {"encoding": "bv", "symmetry_breaking": True}),
+    ("onehot", {"encoding": "onehot"}),
+    ("onehot-sym", {"encoding": "onehot", "symmetry_breaking": True}),
+]
+
+def smt_stats(calls):
+    """Summarize the statistics of the calls to findReset (see
+    Learner.findReset) as columns of a result row.
+
+    """
+    return "Solver calls: %d, Table time: %.3f, Build time: %.3f, Check time: %.3f, Model time: %.3f, Assertions: %d" % (
+        len(calls), sum(c["table_time"] for c in calls), sum(c["build_time"] for c in calls),
+        sum(c["check_time"] for c in calls), sum(c["model_time"] for c in calls),
+        max([c["assertions"] for c in calls], default=0))
+
+def smt_learn_dota(folder_name, file_name, output_name=None, **options):
+    """Test the folder/file.json and write statistics into ./results/folder.txt
+    (or ./results/output_name.txt). options are passed to learn_ota.
+
+    """
+    if output_name is None:
+        output_name = folder_name
+    with open("./result/%s.txt" % output_name, "a") as output_file:
         locs = 0
         mems, eqs, timer = [], [], []
         trans_num = 0
@@ -20,15 +46,16 @@ def smt_learn_dota(folder_name, file_name):
         o = buildOTA("./examples/DOTA/%s/%s" % (folder_name, file_name))
         trans_num += len(o.trans)
         start_time = time.perf_counter()
-        learned_ota, mem_num, eq_num = learn_ota(o, verbose=False)
+        calls = []
+        learned_ota, mem_num, eq_num = learn_ota(o, verbose=False, stats_callback=calls.append, **options)
         end_time = time.perf_counter()
         trans_num = len(o.trans)
         mems.append(mem_num)
         eqs.append(eq_num)
         loc = len(learned_ota.locations) - 1
         locs += loc
-        output_file.write("File name: %s, Time: %.3f, Membership query: %d, Equivalence query: %d, Locations: %d, Transitions: %d \n" 
-                    % (file_name, end_time - start_time, mem_num, eq_num, loc, trans_num))
+        output_file.write("File name: %s, Time: %.3f, Membership query: %d, Equivalence query: %d, Locations: %d, Transitions: %d, %s\n" 
+                    % (file_name, end_time - start_time, mem_num, eq_num, loc, trans_num, smt_stats(calls)))
         output_file.flush()
 
 def smt_learn_ocmm(folder_name, file_name):
@@ -41,14 +68,15 @@ def smt_learn_ocmm(folder_name, file_name):
         o = buildOCMM("./%s" % file_name)
         trans_num += len(o.trans)
         start_time = time.perf_counter()
-        learned_ota, mem_num, eq_num = learn_ocmm(o, limit=150, verbose=False)
+        calls = []
+        learned_ota, mem_num, eq_num = learn_ocmm(o, limit=150, verbose=False, stats_callback=calls.append)
         end_time = time.perf_counter()
         mems.append(mem_num)
         eqs.append(eq_num)
         loc = len(learned_ota.locations) - 1
         locs += loc
-        output_file.write("Test %s: %s, Membership query: %d, Equivalence query: %d, Locations: %d, Transitions: %d\n" 
-                    % (file_name, end_time - start_time, mem_num, eq_num, loc, trans_num))
+        output_file.write("Test %s: %s, Membership query: %d, Equivalence query: %d, Locations: %d, Transitions: %d, %s\n" 
+                    % (file_name, end_time - start_time, mem_num, eq_num, loc, trans_num, smt_stats(calls)))
         output_file.flush()
 
 def parse_data(file_name):
@@ -57,17 +85,24 @@ def parse_data(file_name):
     test_data = []
     for line in lines:
         test_data.append([float(b.split(":")[1]) for b in line.split(",")[1:]])
-    # time_data, mem_data, eq_data, locs, trans = list(zip(*test_data))
+    # time_data, mem_data, eq_data, locs, trans, followed by the columns of
+    # smt_stats (calls, table, build, check, model, assertions) if present.
     return list(zip(*test_data))
 
 def analyze(file_name):
     """Write the experimental result to ./result/file_name.txt. """
-    time_data, mem_data, eq_data, locs, trans = parse_data(file_name)
+    columns = parse_data(file_name)
+    time_data, mem_data, eq_data, locs, trans = columns[:5]
     
     with open(file_name, "a") as f:
         f.write("Delta: %.3f #M_min: %d #M_mean: %.2f #M_max:%d #E_min:%d #E_mean:%.2f #E_max:%d l:%.1f t(s):%.3f" % (
             mean(trans), min(mem_data), mean(mem_data), max(mem_data), min(eq_data), mean(eq_data), max(eq_data), mean(locs), mean(time_data)
         ))
+        if len(columns) > 5:
+            calls, table_time, build_time, check_time, model_time = columns[5:10]
+            f.write(" #C_mean:%.2f table(s):%.3f build(s):%.3f check(s):%.3f model(s):%.3f" % (
+                mean(calls), mean(table_time), mean(build_time), mean(check_time), mean(model_time)
+            ))
 
 
 if __name__ == "__main__":
@@ -79,5 +114,10 @@ if __name__ == "__main__":
         smt_learn_dota(folder_name, file_name)
     elif sys.argv[1] == "ocmm":
         smt_learn_ocmm(folder_name, file_name)
+    elif sys.argv[1] == "encoding":
+        # Results of each configuration go to ./result/folder_config.txt
+        file_name = file_name.split("/")[-1]
+        for config, options in ENCODING_CONFIGS:
+            smt_learn_dota(folder_name, file_name, "%s_%s" % (folder_name, config), **options)
     else:
-        print("You should input either `dota` or `ocmm`, e.g.\n ./run_dota dota 3_2_10")
\ No newline at end of file
+        print("You should input `dota`, `ocmm` or `encoding`, e.g.\n ./run_dota dota 3_2_10")
\ No newline at end of file
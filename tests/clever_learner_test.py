@@ -0,0 +1,44 @@
+# Unit test for clever_learner.py
+
+import unittest
+import sys
+sys.path.append("./")
+from ota import TimedWord, buildOTA
+from clever_learner import Learner, learn_ota
+
+
+class CleverLearnerTest(unittest.TestCase):
+    def testFindReset(self):
+        ota = buildOTA('./examples/DOTA/a.json')
+        learner = Learner(ota)
+        learner.addPath((TimedWord('a', 1), TimedWord('b', 2)))
+        resets, states = learner.findReset()
+        self.assertIsNotNone(resets)
+        num_assertions = len(learner.solver.assertions())
+
+        # The second call reuses the solver without adding formulas.
+        resets2, states2 = learner.findReset()
+        self.assertIsNotNone(resets2)
+        self.assertEqual(len(learner.solver.assertions()), num_assertions)
+        self.assertEqual(learner.solver.num_scopes(), 0)
+
+        # Banned resets are enabled by assumptions, and can be cleared.
+        learner.addReset(resets)
+        learner.findReset()
+        learner.banned_reset.clear()
+        self.assertEqual(learner.findReset()[1]["sink"], states["sink"])
+
+    def testLearn(self):
+        test_cases = [
+            "DOTA/a.json",
+            "DOTA/3_2_10/3_2_10-2.json",
+            "DOTA/OTAs/Light.json",
+        ]
+
+        for f in test_cases:
+            ota = buildOTA('./examples/%s' % f)
+            self.assertIsNotNone(learn_ota(ota, limit=100, verbose=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# Unit test for equivalence_simple.py
+
+import unittest
+import sys
+sys.path.append("./")
+
+from ota import buildOTA, buildAssistantOTA
+from ocmm import buildOCMM, buildAssistantOCMM
+from equivalence_simple import OTAEquivalence, IncrementalEquivalence, TransitionTable, LESS, EQ, GREATER
+
+
+class EquivalenceSimpleTest(unittest.TestCase):
+    def testPack(self):
+        ota = buildAssistantOTA(buildOTA('./examples/DOTA/a.json'))
+        equiv = OTAEquivalence(10, ota, ota)
+        for config in [(0, 0, 0, 0, EQ), (1, 3, 2, 5, LESS), (2, 21, 0, 7, GREATER)]:
+            self.assertEqual(equiv.unpack(equiv.pack(*config)), config)
+
+    def testDelayOne(self):
+        ota = buildAssistantOTA(buildOTA('./examples/DOTA/a.json'))
+        equiv = OTAEquivalence(2, ota, ota)
+        self.assertEqual(equiv.delay_one(0, 0, EQ), (1, 1, EQ))
+        self.assertEqual(equiv.delay_one(0, 1, EQ), (1, 1, LESS))
+        self.assertEqual(equiv.delay_one(1, 1, LESS), (1, 2, EQ))
+        self.assertEqual(equiv.delay_one(4, 3, EQ), (5, 3, EQ))
+
+        # The delay successor graph is shared by tests with the same max_value
+        regions, chain = (0, 0, EQ), []
+        while regions is not None:
+            chain.append(regions)
+            regions = equiv.delay_succ(regions)
+        self.assertEqual(chain[-1], (5, 5, EQ))
+        self.assertIs(OTAEquivalence(2, ota, ota).delay_graph, equiv.delay_graph)
+
+    def testTransitionTable(self):
+        ota = buildAssistantOTA(buildOTA('./examples/DOTA/a.json'))
+        table = TransitionTable(ota)
+        self.assertEqual(table.last_region, 9)
+        loc1, loc2, loc3 = table.loc_id["1"], table.loc_id["2"], table.loc_id["3"]
+        sink = table.loc_id[ota.sink_name]
+
+        # Transition 1 --a, [1,3), n--> 2
+        self.assertEqual(table.lookup(loc1, 2)[0], (loc2, False, False))
+        self.assertEqual(table.lookup(loc1, 5)[0], (loc2, False, False))
+        self.assertEqual(table.lookup(loc1, 6)[0], (sink, True, False))
+        # Transition 2 --b, [2,4), r--> 3, to an accepting location
+        self.assertEqual(table.lookup(loc2, 7)[1], (loc3, True, True))
+        # Regions after (4, oo) are the same as (4, oo)
+        self.assertEqual(table.lookup(loc1, 20), table.lookup(loc1, 9))
+
+        ocmm = buildAssistantOCMM(buildOCMM('./examples/MMT/OCMMs/Light.json'))
+        table = TransitionTable(ocmm)
+        for tran in ocmm.trans:
+            region = 2 * tran.constraint.min_value + (0 if tran.constraint.closed_min else 1)
+            target, reset, output = table.lookup(table.loc_id[tran.source], region)[ocmm.sigma.index(tran.input)]
+            self.assertEqual((table.locs[target], reset, output), (tran.target, tran.reset, tran.output))
+
+    def testCounterexample(self):
+        test_cases = [
+            ("DOTA/3_2_10/3_2_10-1.json", "DOTA/3_2_10/3_2_10-2.json"),
+            ("DOTA/a.json", "DOTA/b.json"),
+        ]
+
+        for f1, f2 in test_cases:
+            ota_A = buildAssistantOTA(buildOTA('./examples/%s' % f1))
+            ota_B = buildAssistantOTA(buildOTA('./examples/%s' % f2))
+            res, ctx = OTAEquivalence(10, ota_A, ota_B).test_equivalent()
+            self.assertFalse(res)
+            self.assertNotEqual(ota_A.runTimedWord(ctx) == 1, ota_B.runTimedWord(ctx) == 1)
+
+            res, ctx = OTAEquivalence(10, ota_A, ota_A).test_equivalent()
+            self.assertTrue(res)
+            self.assertIsNone(ctx)
+
+    def testFindCounterexamples(self):
+        ota_A = buildAssistantOTA(buildOTA('./examples/DOTA/3_2_10/3_2_10-1.json'))
+        ota_B = buildAssistantOTA(buildOTA('./examples/DOTA/3_2_10/3_2_10-2.json'))
+        equiv = OTAEquivalence(10, ota_A, ota_B)
+        ctxs = equiv.find_counterexamples(3)
+        self.assertGreater(len(ctxs), 1)
+        self.assertLessEqual(len(ctxs), 3)
+        self.assertEqual(ctxs[0], equiv.test_equivalent()[1])
+        self.assertEqual([len(ctx) for ctx in ctxs], sorted(len(ctx) for ctx in ctxs))
+        for ctx in ctxs:
+            self.assertNotEqual(ota_A.runTimedWord(ctx) == 1, ota_B.runTimedWord(ctx) == 1)
+
+        self.assertEqual(OTAEquivalence(10, ota_A, ota_A).find_counterexamples(3), [])
+
+    def testIncremental(self):
+        ota_A = buildAssistantOTA(buildOTA('./examples/DOTA/3_2_10/3_2_10-1.json'))
+        ota_B = buildAssistantOTA(buildOTA('./examples/DOTA/3_2_10/3_2_10-2.json'))
+        ota_C = buildAssistantOTA(buildOTA('./examples/DOTA/3_2_10/3_2_10-3.json'))
+        incremental = IncrementalEquivalence(ota_A)
+        equiv = incremental.equivalence_test(10, ota_B)
+        ctxs = equiv.find_counterexamples(3)
+        cache = dict(equiv.succ_cache)
+        self.assertGreater(len(cache), 0)
+
+        # Nothing changed, all successors are kept.
+        equiv = incremental.equivalence_test(10, ota_B)
+        self.assertEqual(equiv.succ_cache, cache)
+        self.assertEqual(equiv.find_counterexamples(3), ctxs)
+
+        for ota in [ota_C, ota_A, ota_B]:
+            equiv = incremental.equivalence_test(10, ota)
+            self.assertEqual(equiv.find_counterexamples(3),
+                             OTAEquivalence(10, ota_A, ota).find_counterexamples(3))
+
+if __name__ == "__main__":
+    unittest.main()
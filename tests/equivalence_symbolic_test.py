@@ -0,0 +1,77 @@
+# Unit test for equivalence_symbolic.py
+
+import unittest
+import sys
+from fractions import Fraction
+sys.path.append("./")
+
+from ota import buildOTA, buildAssistantOTA
+from ocmm import buildOCMM, buildAssistantOCMM
+from interval import Interval
+from equivalence_simple import OTAEquivalence
+from equivalence_symbolic import DBM, SymbolicEquivalence, INF
+
+
+class EquivalenceSymbolicTest(unittest.TestCase):
+    def testDBM(self):
+        # After a delay and the guard 1 < x_A <= 2, reset x_B.
+        zone = DBM.zero().up().guard(1, Interval("(1,2]")).reset(2)
+        self.assertIsNotNone(zone)
+
+        # x_A - x_B stays in (1, 2] under delays.
+        zone = zone.up()
+        self.assertEqual(zone.guard(2, Interval("[0,1]")).delay_range([0, Fraction(3, 2), 0]),
+                         (0, True, 1, True))
+        self.assertIsNone(zone.guard(1, Interval("[0,1]")))
+        self.assertIsNone(zone.guard(2, Interval("[2,+)")).guard(1, Interval("[0,3]")))
+        self.assertTrue(zone.includes(zone.guard(2, Interval("[0,1)"))))
+
+        # Points from which the zone where x_A = 3 is reached by a delay.
+        down = zone.guard(1, Interval("[3,3]")).down()
+        self.assertEqual(down.d[1*3+0], 2 * 3 + 1)
+        # x_A > 1, since x_B >= 0
+        self.assertEqual(down.d[0*3+1], 2 * -1)
+
+        # Extrapolation drops bounds above the maximal constant.
+        zone = DBM.zero().up().guard(1, Interval("[5,+)")).reset(2)
+        self.assertEqual(zone.extrapolate(3).d[1*3+2], INF)
+
+    def testCounterexample(self):
+        test_cases = [
+            ("DOTA/3_2_10/3_2_10-1.json", "DOTA/3_2_10/3_2_10-2.json"),
+            ("DOTA/a.json", "DOTA/b.json"),
+            ("DOTA/7_4_10/7_4_10-1.json", "DOTA/7_4_10/7_4_10-2.json"),
+        ]
+
+        for f1, f2 in test_cases:
+            ota_A = buildAssistantOTA(buildOTA('./examples/%s' % f1))
+            ota_B = buildAssistantOTA(buildOTA('./examples/%s' % f2))
+            res, ctx = SymbolicEquivalence(10, ota_A, ota_B).test_equivalent()
+            self.assertFalse(res)
+            self.assertNotEqual(ota_A.runTimedWord(ctx) == 1, ota_B.runTimedWord(ctx) == 1)
+
+            # Counterexamples of both tests are shortest.
+            _, region_ctx = OTAEquivalence(10, ota_A, ota_B).test_equivalent()
+            self.assertEqual(len(ctx), len(region_ctx))
+
+            res, ctx = SymbolicEquivalence(10, ota_A, ota_A).test_equivalent()
+            self.assertTrue(res)
+            self.assertIsNone(ctx)
+
+    def testFindCounterexamples(self):
+        ota_A = buildAssistantOTA(buildOTA('./examples/DOTA/3_2_10/3_2_10-1.json'))
+        ota_B = buildAssistantOTA(buildOTA('./examples/DOTA/3_2_10/3_2_10-2.json'))
+        ctxs = SymbolicEquivalence(10, ota_A, ota_B).find_counterexamples(3)
+        self.assertGreater(len(ctxs), 1)
+        for ctx in ctxs:
+            self.assertNotEqual(ota_A.runTimedWord(ctx) == 1, ota_B.runTimedWord(ctx) == 1)
+
+    def testOCMM(self):
+        ocmm = buildOCMM('./examples/MMT/OCMMs/Light.json')
+        ocmm_A = buildAssistantOCMM(ocmm)
+        res, ctx = SymbolicEquivalence(10, ocmm_A, ocmm_A).test_equivalent()
+        self.assertTrue(res)
+
+
+if __name__ == "__main__":
+    unittest.main()
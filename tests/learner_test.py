@@ -1,6 +1,8 @@
 # Unit test for learner.py
 
 import unittest
+import sys
+import inspect
 
 from learner import TestSequence, Learner, learn_ota
 from ota import TimedWord, buildOTA, buildAssistantOTA
@@ -47,6 +49,40 @@ class LearnerTest(unittest.TestCase):
         candidateOTA = learner.buildCandidateOTA()
         # print(candidateOTA)
 
+    def testFindReset(self):
+        ota = buildOTA('./examples/DOTA/3_2_10/3_2_10-3.json')
+        learner = Learner(ota)
+        for tws in [(('a', 1), ('b', 2)), (('b', 3), ('a', 1)), (('a', 2), ('a', 1), ('b', 0))]:
+            learner.addPath(tuple(TimedWord(action, time) for action, time in tws))
+        learner.E = [(TimedWord('a', 0),), (TimedWord('b', 0),), (TimedWord('a', 1),)]
+
+        # With S = [()], some key in R cannot be mapped under any resets.
+        resets, foundR_count = learner.findReset()
+        self.assertIsNone(resets)
+        self.assertEqual(set(foundR_count), set(tws for tws, info in learner.R.items() if not info.is_sink))
+
+        learner.addToS((TimedWord('b', 3),))
+        resets, foundR = learner.findReset()
+        self.assertIsNotNone(resets)
+        self.assertTrue(all(foundR[tws] is not None for tws in foundR))
+        self.assertTrue(learner.checkForbiddenPairs(resets, foundR))
+        self.assertTrue(learner.checkInvalidRow(resets, foundR))
+        self.assertIsNone(learner.checkConsistent(resets, foundR))
+
+    def testFindResetDeep(self):
+        # The search over resets does not recurse once per key.
+        ota = buildOTA('./examples/DOTA/OTAs/Light.json')
+        learner = Learner(ota)
+        learner.addPath(tuple(TimedWord(action, 1) for action in ('press?', 'release?') * 60))
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(len(inspect.stack()) + 50)
+        try:
+            resets, foundR = learner.findReset()
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertIsNotNone(resets)
+        self.assertTrue(learner.checkForbiddenPairs(resets, foundR))
+
     def testLearn(self):
         ota = buildOTA('./examples/e.json')
         learn_ota(ota, limit=15, verbose=False)
@@ -1,11 +1,103 @@
 import unittest
 import cProfile
 import time
+import os
+import tempfile
 import ocmm
 import ocmm_smart_learner
+from equivalence_simple import TransitionTable
+from equivalence_ocmm import OCMMEquivalence
+from portfolio import CONFIGS
+from checkpoint import load_checkpoint
 from pstats import Stats
 
 class OCMMLearner(unittest.TestCase):
+    def assertLearnsTeacher(self, f, **options):
+        """Learn the OCMM in examples/MMT/OCMMs with the given options, and
+        check that the learned OCMM is equivalent to it. Returns the result
+        of learn_ocmm.
+
+        """
+        o = ocmm.buildOCMM("./examples/MMT/OCMMs/%s.json" % f)
+        learned, mem_num, eq_num = ocmm_smart_learner.learn_ocmm(o, limit=100, verbose=False, **options)
+        # buildAssistantOCMM modifies its argument, so use a fresh copy.
+        teacher = ocmm.buildOCMM("./examples/MMT/OCMMs/%s.json" % f)
+        max_time = max(ocmm_smart_learner.compute_max_time(teacher),
+                       ocmm_smart_learner.compute_max_time(learned))
+        res, _ = OCMMEquivalence(max_time, ocmm.buildAssistantOCMM(teacher), learned).test_equivalent()
+        self.assertTrue(res)
+        return learned, mem_num, eq_num
+
+    def testCheckpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "light.ckpt")
+            o = ocmm.buildOCMM("./examples/MMT/OCMMs/Light.json")
+            learned, _, eq_num = ocmm_smart_learner.learn_ocmm(
+                o, limit=100, verbose=False, checkpoint=path, checkpoint_interval=0, num_ctx=2)
+            _, loop_state = load_checkpoint(path, ocmm.buildOCMM("./examples/MMT/OCMMs/Light.json"))
+            self.assertEqual(loop_state["options"]["num_ctx"], 2)
+
+            # Resuming continues with the saved options.
+            calls = []
+            resumed, _, eq_num2 = ocmm_smart_learner.resume_ocmm(
+                ocmm.buildOCMM("./examples/MMT/OCMMs/Light.json"), path, limit=100, verbose=False,
+                eq_stats_callback=calls.append)
+            self.assertGreaterEqual(eq_num2, eq_num)
+            self.assertEqual(len(resumed.locations), len(learned.locations))
+            self.assertGreater(len(calls), 0)
+
+    def testReplay(self):
+        for f in ["Light", "Train"]:
+            o = ocmm.buildOCMM("./examples/MMT/OCMMs/%s.json" % f)
+            calls = []
+            learned, _, eq_num = ocmm_smart_learner.learn_ocmm(
+                o, limit=100, verbose=False, replay=True, eq_stats_callback=calls.append)
+            self.assertTrue(any(stats["replayed"] for stats in calls))
+            self.assertFalse(calls[-1]["replayed"])
+            self.assertEqual(eq_num, len([stats for stats in calls if not stats["replayed"]]))
+
+            # The learned machine agrees with every membership query and its
+            # prefixes, including those going to the sink.
+            self.assertTrue(any(output == "sink!" for output, _ in o.query2.values()))
+            self.assertIsNone(ocmm_smart_learner.replay_queries(o, learned, TransitionTable(learned)))
+
+    def testResetObservable(self):
+        for f in ["Light", "Train"]:
+            self.assertLearnsTeacher(f, reset_observable=True)
+
+    def testLazySuccessors(self):
+        for f in ["Light", "Train"]:
+            self.assertLearnsTeacher(f, lazy_successors=True)
+
+    def testStateEncoding(self):
+        for encoding in ("int", "bv", "onehot"):
+            for symmetry_breaking in (False, True):
+                self.assertLearnsTeacher("Light", encoding=encoding, symmetry_breaking=symmetry_breaking)
+
+    def testInitialValues(self):
+        for encoding in ("int", "bv", "onehot"):
+            self.assertLearnsTeacher("Light", encoding=encoding, phase_hints=True)
+
+    def testSearchStateNum(self):
+        self.assertLearnsTeacher("Train", state_num_search="galloping")
+
+    def testPortfolio(self):
+        self.assertLearnsTeacher("Light", portfolio=CONFIGS, portfolio_delay=0)
+
+    def testMultipleCounterexamples(self):
+        for f in ["Light", "Train"]:
+            calls = []
+            self.assertLearnsTeacher(f, num_ctx=3, eq_stats_callback=calls.append)
+            self.assertEqual(calls[-1]["num_ctx"], 0)
+
+    def testIncremental(self):
+        for f in ["Light", "Train"]:
+            self.assertLearnsTeacher(f, incremental=True)
+
+    def testSymbolicEquivalence(self):
+        for f in ["Light", "Train"]:
+            self.assertLearnsTeacher(f, equivalence="symbolic")
+
     def testOCMMLearner(self):
         test_cases = [
             "Light", # 0.388
@@ -33,6 +33,20 @@ class OCMMTest(unittest.TestCase):
             self.assertEqual(ocmm.runTimedWord(itws), res1)
             self.assertEqual(assist_ocmm.runTimedWord(itws), res2)
 
+    def testRunTimedWordReset(self):
+        ocmm = buildOCMM('./examples/MMT/OCMMs/Light.json')
+
+        test_data = [
+            # (input timed word, output, resets)
+            (tuple(), (None, 1), ()),
+            ((TimedWord('press?', 1),), ('void', 1), (True,)),
+            ((TimedWord('press?', 1), TimedWord('void', 5),), ('beep!', 1), (True, True)),
+            ((TimedWord('press?', 1), TimedWord('release?', 5), TimedWord('press?', 1)), ('sink!', -1), (True, True, True)),
+        ]
+        for itws, res, resets in test_data:
+            self.assertEqual(ocmm.runTimedWordReset(itws), (res, resets))
+            self.assertIn(itws, ocmm.query1)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,16 +1,36 @@
 import unittest
 import sys
 sys.path.append("./")
-from ota import buildOTA, OTAToDOT
-from smart_learner import learn_ota, generate_pair, compute_max_time
+from ota import TimedWord, buildOTA, buildAssistantOTA, OTAToDOT
+from smart_learner import Learner, learn_ota, resume_ota, generate_pair, compute_max_time, search_state_num, replay_queries
+from checkpoint import load_checkpoint, restore_options
+from portfolio import solve_portfolio, CONFIGS
 from equivalence import ota_equivalent
+from equivalence_simple import OTAEquivalence, TransitionTable
 from pstats import Stats
 import cProfile
 import time
 from statistics import mean
+import os
+import tempfile
+import json
+import z3
 
 
 class SmartLearnerTest(unittest.TestCase):
+    def assertLearnsTeacher(self, f, build=buildOTA, **options):
+        """Learn the OTA in examples/f with the given options, and check
+        that the learned OTA is equivalent to it. The OTA is built from
+        the file by build. Returns the result of learn_ota.
+
+        """
+        o = build("./examples/%s" % f)
+        learned_ota, mem_num, eq_num = learn_ota(o, verbose=False, **options)
+        max_time = max(compute_max_time(o), compute_max_time(learned_ota))
+        res, _ = OTAEquivalence(max_time, buildAssistantOTA(o), learned_ota).test_equivalent()
+        self.assertTrue(res)
+        return learned_ota, mem_num, eq_num
+
     def testGen(self):
         test_cases = [
             [(), (0,), ((-1, 0), (-1, -1))],
@@ -26,6 +46,290 @@ class SmartLearnerTest(unittest.TestCase):
             self.assertEqual(len(res), len(pairs))
             self.assertEqual(set(res), set(pairs))
 
+    def testCheckpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "a.ckpt")
+            o = buildOTA("./examples/DOTA/a.json")
+            learned_ota, mem_num, eq_num = learn_ota(o, verbose=False, checkpoint=path, checkpoint_interval=0)
+
+            # The checkpoint holds the state after the last counterexample.
+            o2 = buildOTA("./examples/DOTA/a.json")
+            learner, loop_state = load_checkpoint(path, o2)
+            self.assertEqual(loop_state["eq_query_num"], eq_num - 1)
+            self.assertEqual(len(o2.query), len(o.query))
+            self.assertIs(learner.ota, o2)
+            resets, states = learner.findReset(loop_state["state_num"], True)
+            self.assertIsNotNone(resets)
+
+            # Resuming continues from the last counterexample.
+            o3 = buildOTA("./examples/DOTA/a.json")
+            resumed_ota, mem_num2, eq_num2 = resume_ota(o3, path, verbose=False)
+            self.assertGreaterEqual(eq_num2, eq_num)
+            self.assertGreaterEqual(mem_num2, mem_num)
+            self.assertEqual(len(resumed_ota.locations), len(learned_ota.locations))
+
+    def testCheckpointOptions(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "a.ckpt")
+            o = buildOTA("./examples/DOTA/a.json")
+            learn_ota(o, verbose=False, checkpoint=path, checkpoint_interval=0,
+                      num_ctx=2, equivalence="symbolic")
+            _, loop_state = load_checkpoint(path, buildOTA("./examples/DOTA/a.json"))
+            self.assertEqual(loop_state["options"]["num_ctx"], 2)
+            self.assertEqual(loop_state["options"]["equivalence"], "symbolic")
+
+            # The saved options replace the given ones, callbacks are passed on.
+            options = restore_options(loop_state, dict(num_ctx=1, equivalence="region", replay=True))
+            self.assertEqual(options["num_ctx"], 2)
+            self.assertEqual(options["equivalence"], "symbolic")
+            self.assertFalse(options["replay"])
+            calls = []
+            resume_ota(buildOTA("./examples/DOTA/a.json"), path, verbose=False,
+                       eq_stats_callback=calls.append)
+            self.assertGreater(len(calls), 0)
+
+    def testWarmStart(self):
+        test_cases = [
+            "DOTA/a.json",
+            "DOTA/3_2_10/3_2_10-2.json",
+            "DOTA/5_2_10/5_2_10-1.json",
+        ]
+
+        for f in test_cases:
+            o = buildOTA("./examples/%s" % f)
+            learned_ota, mem_num, eq_num = learn_ota(o, verbose=False)
+            _, mem_num2, eq_num2 = self.assertLearnsTeacher(f, hypothesis=learned_ota)
+            self.assertLessEqual(eq_num2, eq_num)
+
+    def testWarmStartChanged(self):
+        # Relearn 5_2_10-1 with one transition changed, starting from the
+        # OTA learned before the change. Changing the target of 1 -b-> 5
+        # contradicts some of the seeded rows.
+        f = "DOTA/5_2_10/5_2_10-1.json"
+        learned_ota, _, _ = learn_ota(buildOTA("./examples/%s" % f), verbose=False)
+        test_cases = [
+            (("4", "b", "5"), "reset", False),
+            (("1", "b", "5"), "target", "4"),
+        ]
+
+        for key, attr, value in test_cases:
+            def build(jsonfile):
+                o = buildOTA(jsonfile)
+                tran = next(tran for tran in o.trans if (tran.source, tran.action, tran.target) == key)
+                setattr(tran, attr, value)
+                return o
+
+            _, mem_num, eq_num = self.assertLearnsTeacher(f, build=build)
+            _, mem_num2, eq_num2 = self.assertLearnsTeacher(f, build=build, hypothesis=learned_ota)
+            self.assertLess(mem_num2, mem_num)
+            self.assertLess(eq_num2, eq_num)
+
+    def testResetObservable(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        test_data = [
+            ([], (0, ())),
+            ([('a', 1), ('b', 1)], (1, (False, True))),
+            ([('a', 1), ('b', 1), ('a', 1)], (0, (False, True, True))),
+            ([('a', 0), ('b', 1)], (-1, (True, True))),
+        ]
+        for tws, res in test_data:
+            tws = tuple(TimedWord(action, time) for action, time in tws)
+            self.assertEqual(o.runTimedWordReset(tws), res)
+
+        test_cases = [
+            "DOTA/a.json",
+            "DOTA/3_2_10/3_2_10-2.json",
+            "DOTA/5_2_10/5_2_10-1.json",
+            "DOTA/OTAs/Light.json",
+        ]
+
+        for f in test_cases:
+            o = buildOTA("./examples/%s" % f)
+            learned_ota, mem_num, eq_num = learn_ota(o, verbose=False)
+            _, mem_num2, _ = self.assertLearnsTeacher(f, reset_observable=True)
+            self.assertLessEqual(mem_num2, mem_num)
+
+    def testLazySuccessors(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        learner = Learner(o, lazy_successors=True)
+        self.assertEqual(set(learner.pending), {(TimedWord('a', 0),), (TimedWord('b', 0),)})
+        self.assertEqual(set(learner.R), {()})
+
+        test_cases = [
+            "DOTA/a.json",
+            "DOTA/3_2_10/3_2_10-2.json",
+            "DOTA/5_2_10/5_2_10-1.json",
+            "DOTA/OTAs/Light.json",
+        ]
+
+        for f in test_cases:
+            self.assertLearnsTeacher(f, lazy_successors=True)
+
+    def testFindResetBaseScope(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        learner = Learner(o)
+        learner.findReset(1, False)
+        num_assertions = len(learner.solver.assertions())
+        resets, states = learner.findReset(2, False)
+        self.assertIsNotNone(resets)
+        self.assertEqual(learner.solver.num_scopes(), 0)
+        # Only the literal for the new state number is added.
+        self.assertEqual(len(learner.solver.assertions()), num_assertions + 1)
+
+    def testCliqueBound(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        learner = Learner(o)
+        self.assertEqual(learner.cliqueBound(), len(learner.S))
+
+        x, y, z = [(TimedWord('a', t),) for t in (1, 2, 3)]
+        learner.distinct = {x: {y, z}, y: {x, z}, z: {x, y}}
+        self.assertEqual(learner.cliqueBound(), 3)
+        for tw in (x, y, z):
+            learner.distinct[tw].add(())
+        learner.distinct[()] = {x, y, z}
+        self.assertEqual(learner.cliqueBound(), 4)
+
+    def testEncodeReset(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        learner = Learner(o)
+        x, y, z = [(TimedWord('a', t),) for t in (1, 2, 3)]
+        resets_var = {x: z3.Bool("r_x"), y: z3.Bool("r_y"), z: z3.Bool("r_x")}
+        f = learner.encodeReset({x: True, y: False}, resets_var)
+        self.assertTrue(f.eq(learner.encodeReset({y: False, x: True}, resets_var)))
+        self.assertTrue(f.eq(learner.encodeReset({x: True, y: False, z: True}, resets_var)))
+        self.assertTrue(z3.is_false(learner.encodeReset({x: True, z: False}, resets_var)))
+
+        g = z3.Implies(f, z3.Bool("p"))
+        self.assertEqual(len(learner.formulas.newFormulas([g, g])), 1)
+        self.assertEqual(len(learner.formulas.newFormulas([g])), 0)
+
+    def testUnsatCore(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        learner = Learner(o)
+        a1, a1b2 = (TimedWord('a', 1),), (TimedWord('a', 1), TimedWord('b', 2))
+        learner.addPath(a1b2)
+        self.assertEqual(list(learner.S), [(), a1b2])
+
+        # No representative in extra_S for the third location.
+        self.assertEqual(learner.findReset(3, True), (None, None))
+        self.assertTrue(learner.extra_S_in_core)
+        self.assertIsNotNone(learner.findReset(3, False)[0])
+
+        # Too few locations, whatever extra_S.
+        for row in learner.S:
+            learner.constraint1_formula.append(learner.addDistinct(row, a1))
+        self.assertEqual(learner.findReset(2, True), (None, None))
+        self.assertFalse(learner.extra_S_in_core)
+        self.assertEqual(len(learner.core_sizes), 2)
+
+    def testSearchStateNum(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        learner = Learner(o)
+        for tws in [(('a', 1), ('b', 2)), (('a', 1), ('a', 3)), (('b', 1), ('a', 2)), (('a', 2), ('b', 1), ('a', 1))]:
+            learner.addPath(tuple(TimedWord(action, time) for action, time in tws))
+        rows = [row for row in learner.R if not learner.R[row].is_sink]
+        for i, row in enumerate(rows):
+            for row2 in rows[:i]:
+                learner.constraint1_formula.append(learner.addDistinct(row, row2))
+
+        state_num = len(learner.S)
+        while learner.findReset(state_num, False)[0] is None:
+            state_num += 1
+        self.assertEqual(state_num, len(rows))
+        self.assertEqual(search_state_num(learner, len(learner.S)), state_num)
+
+        self.assertLearnsTeacher("DOTA/OTAs/Light.json", state_num_search="galloping")
+
+    def testStateEncoding(self):
+        test_cases = [
+            "DOTA/a.json",
+            "DOTA/3_2_10/3_2_10-2.json",
+            "DOTA/OTAs/Light.json",
+        ]
+
+        for encoding in ("int", "bv", "onehot"):
+            for symmetry_breaking in (False, True):
+                for f in test_cases:
+                    self.assertLearnsTeacher(f, encoding=encoding, symmetry_breaking=symmetry_breaking)
+
+    def testInitialValues(self):
+        test_cases = [
+            "DOTA/a.json",
+            "DOTA/3_2_10/3_2_10-2.json",
+            "DOTA/OTAs/Light.json",
+        ]
+
+        for encoding in ("int", "bv", "onehot"):
+            for f in test_cases:
+                self.assertLearnsTeacher(f, encoding=encoding, phase_hints=True)
+
+    def testPortfolio(self):
+        res, values, config = solve_portfolio("(declare-fun x () Int)(assert (> x 2))(assert (< x 4))")
+        self.assertEqual(res, "sat")
+        self.assertEqual(values["x"], 3)
+        res, values, config = solve_portfolio("(declare-fun x () Int)(assert (> x 2))(assert (< x 3))")
+        self.assertEqual(res, "unsat")
+
+        test_cases = [
+            "DOTA/a.json",
+            "DOTA/OTAs/Light.json",
+        ]
+
+        for f in test_cases:
+            self.assertLearnsTeacher(f, portfolio=CONFIGS, portfolio_delay=0)
+
+    def testDumpQueries(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            o = buildOTA("./examples/DOTA/a.json")
+            learn_ota(o, verbose=False, dump_dir=tmp_dir)
+            with open(os.path.join(tmp_dir, "index.jsonl")) as f:
+                metas = [json.loads(line) for line in f]
+            self.assertGreater(len(metas), 0)
+            for meta in metas:
+                solver = z3.Solver()
+                solver.from_file(os.path.join(tmp_dir, meta["file"]))
+                self.assertEqual(str(solver.check()), meta["result"])
+
+    def testCallStats(self):
+        o = buildOTA("./examples/DOTA/a.json")
+        calls = []
+        learn_ota(o, verbose=False, stats_callback=calls.append)
+        self.assertGreater(len(calls), 0)
+        self.assertEqual(calls[-1]["result"], "sat")
+        for stats in calls:
+            self.assertEqual(stats["scopes"], 0)
+            self.assertGreaterEqual(stats["check_time"], 0)
+            self.assertLessEqual(stats["new_assertions"], stats["assertions"])
+            self.assertIsInstance(stats["z3"], dict)
+
+    def testReplay(self):
+        o = buildOTA("./examples/DOTA/3_2_10/3_2_10-2.json")
+        calls = []
+        learned_ota, _, eq_num = learn_ota(o, verbose=False, replay=True, eq_stats_callback=calls.append)
+        self.assertGreater(len(calls), 0)
+        self.assertFalse(calls[-1]["replayed"])
+        # Only the rounds without replayed counterexample make equivalence queries.
+        self.assertEqual(eq_num, len([stats for stats in calls if not stats["replayed"]]))
+        for stats in calls:
+            self.assertGreaterEqual(stats["replay_time"], 0)
+            if stats["replayed"]:
+                self.assertEqual(stats["check_time"], 0)
+
+        # The learned model agrees with every membership query.
+        self.assertIsNone(replay_queries(o, learned_ota, TransitionTable(learned_ota)))
+
+    def testMultipleCounterexamples(self):
+        calls = []
+        self.assertLearnsTeacher("DOTA/4_2_10/4_2_10-4.json", num_ctx=3, eq_stats_callback=calls.append)
+        self.assertTrue(any(stats["num_ctx"] > 1 for stats in calls))
+        self.assertEqual(calls[-1]["num_ctx"], 0)
+
+    def testIncremental(self):
+        self.assertLearnsTeacher("DOTA/4_2_10/4_2_10-4.json", incremental=True)
+
+    def testSymbolicEquivalence(self):
+        self.assertLearnsTeacher("DOTA/4_2_10/4_2_10-4.json", equivalence="symbolic")
+
     def testLearnOTA(self):
         test_cases = [
             "DOTA/a3.json",